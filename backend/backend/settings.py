@@ -3,6 +3,8 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure- &$%$nk#$6l=qwpvs*^ufs8fokwts2pf%3_r3my4_$(!)=(j09r'
@@ -23,9 +25,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.sessions.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -57,8 +61,22 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not the default in-memory database, so threads in tests wait
+        # on SQLite's write lock instead of failing with "table is locked"
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Cache used by the public catalog endpoints. Point this at a shared backend
+# (Redis/Memcached) when running more than one worker so invalidations are seen
+# by every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'uniforms-default',
     }
 }
+CATALOG_CACHE_TIMEOUT = 60 * 60  # 1 hour in seconds
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,13 +134,15 @@ CORS_ALLOW_HEADERS = [
 ]
 
 # Session settings - Updated for better session handling
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions live in the cache and are written to the database only when they
+# change; expiry slides every half SESSION_COOKIE_AGE (see core/sessions.py).
+SESSION_ENGINE = 'core.sessions'
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # core.sessions refreshes the expiry itself
 
 # CSRF settings
 CSRF_COOKIE_SAMESITE = 'Lax'
@@ -139,10 +159,53 @@ EMAIL_HOST_USER = 'your-email@gmail.com'  # Replace with your email
 EMAIL_HOST_PASSWORD = 'your-app-password'  # Replace with your app password
 DEFAULT_FROM_EMAIL = 'your-email@gmail.com'  # Replace with your email
 
+# Outbound email queue, drained by `python manage.py send_queued_mail --loop`
+MAIL_QUEUE_BATCH_SIZE = 50
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_RETRY_DELAY = 60  # seconds, doubled after every failed attempt
+
+# Product image derivatives (core.images), built in the background after an upload
+# and backfilled with `python manage.py build_image_derivatives`
+PRODUCT_IMAGE_WIDTHS = (200, 400, 800)
+PRODUCT_IMAGE_DERIVATIVES_ON_UPLOAD = True
+
+# Chunked product image uploads (core.uploads), partial files live here until complete
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_chunks')
+CHUNKED_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024
+
+# Unfiltered admin changelists of tables bigger than this show an estimated row
+# count instead of running COUNT(*) (PostgreSQL and MySQL only)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Per-endpoint latency, SQL and external call metrics (core.metrics), served to admins
+# at /api/admin/metrics/. When off the middleware drops out of the chain entirely.
+# Counts are kept per process, so scrape every worker.
+METRICS_ENABLED = True
+
+# Order codes (core.codes). The key scrambles the code sequence, and anyone who knows it
+# can list every code in issue order and look the orders up, so it has no default and
+# must come from the environment. It is separate from SECRET_KEY so rotating that does
+# not touch order codes. Changing it later is safe, new codes that happen to repeat an
+# old one are caught by Order.save and replaced.
+ORDER_CODE_KEY = os.environ.get('ORDER_CODE_KEY')
+if not ORDER_CODE_KEY:
+    raise ImproperlyConfigured('Set the ORDER_CODE_KEY environment variable to a long random string.')
+ORDER_CODE_BLOCK_SIZE = 100  # sequence numbers reserved per database write
+TAILOR_CONFIRMATION_TOKEN_TTL = 7 * 24 * 60 * 60  # seconds a tailor confirmation link stays valid
+
 # PayPal configuration
 PAYPAL_MODE = "sandbox"  # sandbox or live
 PAYPAL_CLIENT_ID = "your-paypal-client-id"
 PAYPAL_CLIENT_SECRET = "your-paypal-client-secret"
+PAYPAL_WEBHOOK_ID = "your-paypal-webhook-id"
+# Gateway client used for all PayPal calls. Set to 'core.paymentgateway.FakeGateway'
+# to run against the in-memory fake instead of PayPal.
+PAYMENT_GATEWAY = 'core.paymentgateway.PayPalGateway'
+PAYPAL_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+PAYPAL_POOL_SIZE = 10
+PAYPAL_CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failures before failing fast
+PAYPAL_CIRCUIT_RESET_TIMEOUT = 30  # seconds before a trial call is let through
 
 # Frontend URL for payment redirects
 FRONTEND_URL = 'http://localhost:3000'  # Update with your frontend URL
\ No newline at end of file
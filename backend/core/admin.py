@@ -1,34 +1,92 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from .models import (
     School, Product, Cart, CartItem, Order, OrderLine, 
-    TailorProfile, DeliveryPartnerProfile, Shipment, Payment
+    TailorProfile, DeliveryPartnerProfile, Shipment, Payment, OutboundEmail,
+    PaymentEvent
 )
+from .images import smallest
 import json
 
+# Unfiltered changelists of tables bigger than this show the planner's row estimate
+ADMIN_ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+
+def estimated_row_count(model):
+    """The database's own row estimate for a table, or None where there is no cheap one"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """Skips COUNT(*) over a whole large table, filtered pages still count exactly"""
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model)
+            if estimate and estimate > ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+class FastChangelistMixin:
+    """
+    Changelists rendered in a constant number of queries.
+    
+    Every relation shown in list_display is joined through list_select_related,
+    and the extra full-table count behind "N total" on filtered pages is off.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 # Custom User Admin to display related profiles
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(FastChangelistMixin, BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'has_tailor_profile', 'has_delivery_profile')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
     
+    def get_queryset(self, request):
+        # Both flags come from EXISTS subqueries instead of two lookups per row
+        return super().get_queryset(request).annotate(
+            _has_tailor_profile=Exists(TailorProfile.objects.filter(user=OuterRef('pk'))),
+            _has_delivery_profile=Exists(DeliveryPartnerProfile.objects.filter(user=OuterRef('pk'))),
+        )
+    
     def has_tailor_profile(self, obj):
-        return hasattr(obj, 'tailorprofile')
+        return obj._has_tailor_profile
     has_tailor_profile.boolean = True
     has_tailor_profile.short_description = 'Is Tailor'
+    has_tailor_profile.admin_order_field = '_has_tailor_profile'
     
     def has_delivery_profile(self, obj):
-        return hasattr(obj, 'deliverypartnerprofile')
+        return obj._has_delivery_profile
     has_delivery_profile.boolean = True
     has_delivery_profile.short_description = 'Is Delivery Partner'
+    has_delivery_profile.admin_order_field = '_has_delivery_profile'
 
 # Unregister the default User admin and register with our custom one
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 
 @admin.register(School)
-class SchoolAdmin(admin.ModelAdmin):
+class SchoolAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('name', 'town', 'province', 'is_active', 'created_at')
     list_filter = ('is_active', 'province', 'created_at')
     search_fields = ('name', 'town', 'province')
@@ -36,28 +94,35 @@ class SchoolAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('school', 'garment_type', 'price', 'image_preview', 'created_at')
+    list_select_related = ('school',)
     list_filter = ('school', 'garment_type', 'created_at')
     search_fields = ('school__name', 'garment_type', 'description')
     readonly_fields = ('created_at', 'image_preview')
+    exclude = ('image_derivatives', 'image_derivatives_source')
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="50" height="50" style="object-fit: cover;" />', obj.image.url)
+            # The smallest derivative is plenty for a 50px preview, fall back to the upload
+            thumbnail = smallest(obj.image_derivatives)
+            url = default_storage.url(thumbnail['name']) if thumbnail else obj.image.url
+            return format_html('<img src="{}" width="50" height="50" style="object-fit: cover;" loading="lazy" />', url)
         return "No Image"
     image_preview.short_description = 'Image Preview'
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'session_key', 'created_at', 'updated_at')
+    list_select_related = ('user',)
     list_filter = ('created_at', 'updated_at')
     search_fields = ('user__username', 'session_key')
     readonly_fields = ('created_at', 'updated_at')
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity', 'student_name', 'created_at')
+    list_select_related = ('cart__user', 'product__school')
     list_filter = ('created_at', 'student_gender')
     search_fields = ('cart__session_key', 'student_name', 'product__school__name')
     readonly_fields = ('created_at', 'measurements_preview')
@@ -69,11 +134,12 @@ class CartItemAdmin(admin.ModelAdmin):
     measurements_preview.short_description = 'Measurements'
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('order_code', 'school', 'customer_name', 'status', 'tailor', 'deadline', 'created_at')
+    list_select_related = ('school', 'tailor')
     list_filter = ('status', 'school', 'created_at')
     search_fields = ('order_code', 'customer_name', 'customer_phone', 'student_name')
-    readonly_fields = ('order_code', 'confirmation_token', 'created_at', 'updated_at', 'assigned_at')
+    readonly_fields = ('order_code', 'created_at', 'updated_at', 'assigned_at')
     list_editable = ('status',)
     
     fieldsets = (
@@ -87,7 +153,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('student_name', 'student_age', 'student_grade', 'student_gender', 'student_height')
         }),
         ('Order Details', {
-            'fields': ('total_amount', 'deadline', 'confirmation_token')
+            'fields': ('total_amount', 'deadline')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'assigned_at'),
@@ -96,14 +162,16 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
 @admin.register(OrderLine)
-class OrderLineAdmin(admin.ModelAdmin):
+class OrderLineAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'student_name')
+    list_select_related = ('order', 'product__school')
     list_filter = ('product__garment_type',)
     search_fields = ('order__order_code', 'product__school__name', 'student_name')
 
 @admin.register(TailorProfile)
-class TailorProfileAdmin(admin.ModelAdmin):
+class TailorProfileAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('user', 'id_number', 'nationality', 'town', 'is_approved', 'is_email_verified', 'created_at')
+    list_select_related = ('user',)
     list_filter = ('is_approved', 'is_email_verified', 'province', 'created_at')
     search_fields = ('user__username', 'user__email', 'id_number', 'user__first_name', 'user__last_name')
     filter_horizontal = ('schools',)
@@ -131,8 +199,9 @@ class TailorProfileAdmin(admin.ModelAdmin):
     )
 
 @admin.register(DeliveryPartnerProfile)
-class DeliveryPartnerProfileAdmin(admin.ModelAdmin):
+class DeliveryPartnerProfileAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('user', 'id_number', 'town', 'province', 'vehicle_type', 'is_approved', 'is_email_verified', 'created_at')
+    list_select_related = ('user',)
     list_filter = ('is_approved', 'is_email_verified', 'province', 'created_at')
     search_fields = ('user__username', 'user__email', 'id_number', 'user__first_name', 'user__last_name')
     readonly_fields = ('email_verification_code', 'created_at')
@@ -162,15 +231,40 @@ class DeliveryPartnerProfileAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Shipment)
-class ShipmentAdmin(admin.ModelAdmin):
+class ShipmentAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('order', 'delivery_partner', 'status', 'tracking_code', 'created_at')
+    list_select_related = ('order', 'delivery_partner')
     list_filter = ('status', 'created_at')
     search_fields = ('order__order_code', 'tracking_code')
     readonly_fields = ('created_at', 'picked_up_at', 'delivered_at')
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ('order', 'amount', 'method', 'status', 'created_at')
+    list_select_related = ('order',)
     list_filter = ('status', 'method', 'created_at')
     search_fields = ('order__order_code', 'transaction_id')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(FastChangelistMixin, admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(FastChangelistMixin, admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'resource_id', 'status', 'attempts', 'event_created_at', 'received_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('event_id', 'resource_id')
+    # Events are a record of what the gateway sent; only status and next_attempt_at stay
+    # editable, so a failed event can be queued again
+    readonly_fields = ('event_id', 'event_type', 'resource_id', 'payload', 'event_created_at', 'received_at',
+                       'attempts', 'processed_at', 'last_error')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalogcache import bump_version, get_version
+from .models import TailorProfile
+
+TAILOR_INDEX_SCOPE = 'tailors'
+TAILOR_INDEX_TIMEOUT = 60 * 60
+
+
+def eligible_tailor_ids(school_id):
+    """Approved, verified tailor profile ids serving a school, served from the cache"""
+    key = f'tailors:v{get_version(TAILOR_INDEX_SCOPE)}:school:{school_id}'
+    tailor_ids = cache.get(key)
+    if tailor_ids is None:
+        tailor_ids = list(
+            TailorProfile.schools.through.objects
+            .filter(
+                school_id=school_id,
+                tailorprofile__is_approved=True,
+                tailorprofile__is_email_verified=True,
+            )
+            .values_list('tailorprofile_id', flat=True)
+        )
+        cache.set(key, tailor_ids, TAILOR_INDEX_TIMEOUT)
+    return tailor_ids
+
+
+def invalidate_tailor_index():
+    bump_version(TAILOR_INDEX_SCOPE)
+
+
+def assign_order(order):
+    """
+    Assign an order to the least-loaded eligible tailor of its school.
+
+    Runs in one transaction with the candidate tailor rows locked and writes
+    the order once; the tailor's open_orders counter is bumped by the Order
+    post_save signal. Returns (TailorProfile, confirmation token), or
+    (None, None) if nobody serves the school. The plaintext token is only
+    ever returned, the database keeps its digest.
+    """
+    tailor_ids = eligible_tailor_ids(order.school_id)
+    if not tailor_ids:
+        return None, None
+
+    with transaction.atomic():
+        candidates = TailorProfile.objects.filter(pk__in=tailor_ids)
+        if connection.features.has_select_for_update:
+            candidates = candidates.select_for_update(of=('self',))
+        else:
+            # SQLite has no row locks; a write takes its database lock until commit, so
+            # the counts read below cannot change before this order is saved
+            candidates.update(open_orders=F('open_orders'))
+        # The ids come from the cache and may be stale, the flags are checked again on
+        # the locked rows; the school join is what the cache is there to save
+        tailor = min(
+            candidates.select_related('user').filter(is_approved=True, is_email_verified=True).order_by('pk'),
+            key=lambda profile: (profile.open_orders, profile.pk),
+            default=None,
+        )
+        if tailor is None:
+            return None, None
+
+        order.set_deadline(commit=False)
+        order.tailor = tailor.user
+        order.assigned_at = timezone.now()
+        order.save()
+        token = order.generate_confirmation_token()
+
+    return tailor, token
@@ -0,0 +1,100 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def throwaway_database():
+    """Run a benchmark against a freshly migrated test database, never the real one"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, query_counts=None):
+    """Throughput and latency percentiles (milliseconds) for one benchmark run"""
+    summary = {
+        'requests': len(latencies),
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+    if query_counts is not None:
+        summary['queries_per_request'] = round(sum(query_counts) / len(query_counts), 2) if query_counts else 0.0
+    return summary
+
+
+def timed_request(send):
+    """Call send() capturing its latency and executed SQL, returns (response, seconds, queries)"""
+    # The query log is capped at 9000 entries; once full, CaptureQueriesContext sees nothing
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = send()
+        duration = time.perf_counter() - start
+    return response, duration, queries.captured_queries
+
+
+def seed_benchmark_data(schools=10, orders_per_school=50, seed=0):
+    """
+    A small deterministic shop: every garment at every school, one approved
+    tailor and one delivery partner serving all of it, and paid orders
+    with shipments so their feeds have pages to serve.
+    """
+    from .models import DeliveryPartnerProfile, Order, OrderLine, Product, School, Shipment, TailorProfile
+
+    rng = random.Random(seed)
+    school_rows = School.objects.bulk_create([
+        School(name=f'Benchmark School {i}', address=f'{i} Bench Rd', is_active=True) for i in range(schools)
+    ])
+    products = Product.objects.bulk_create([
+        Product(school=school, garment_type=garment_type, price=Decimal(rng.randint(10, 60)))
+        for school in school_rows
+        for garment_type, _ in Product.GARMENT_TYPES
+    ])
+
+    tailor = User.objects.create_user(username='bench-tailor', password='bench', email='tailor@bench.test')
+    TailorProfile.objects.create(user=tailor, is_approved=True).schools.set(school_rows)
+    courier = User.objects.create_user(username='bench-courier', password='bench', email='courier@bench.test')
+    DeliveryPartnerProfile.objects.create(user=courier, is_approved=True)
+    customer = User.objects.create_user(username='bench-customer', password='bench', email='customer@bench.test')
+
+    by_school = {}
+    for product in products:
+        by_school.setdefault(product.school_id, []).append(product)
+    for school in school_rows:
+        for _ in range(orders_per_school):
+            # save() allocates the order code and, once paid, updates the sales rollups
+            order = Order.objects.create(
+                school=school, customer_name='Bench Parent', customer_email='parent@bench.test', tailor=tailor,
+            )
+            lines = OrderLine.objects.bulk_create([
+                OrderLine(order=order, product=product, quantity=rng.randint(1, 3), price=product.price,
+                          student_name='Bench Student')
+                for product in rng.sample(by_school[school.id], 2)
+            ])
+            order.total_amount = sum(line.price * line.quantity for line in lines)
+            order.status = rng.choice(('confirmed', 'in_production', 'shipped'))
+            order.save()
+            Shipment.objects.create(order=order, delivery_partner=courier, status='assigned')
+
+    return {'schools': school_rows, 'products': products, 'tailor': tailor, 'courier': courier, 'customer': customer}
@@ -1,86 +1,91 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
+from django.db import IntegrityError, transaction
 from django.utils.crypto import get_random_string
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from .serializers import CartSerializer, CartItemSerializer, BulkAddToCartSerializer, pop_measurements
+
+def get_session_cart(request):
+    """Get or create the cart of the request's session, starting a session if needed"""
+    session_key = request.session.session_key
+    if not session_key:
+        request.session.create()
+        session_key = request.session.session_key
+        request.session.modified = True
+    
+    cart, created = Cart.objects.get_or_create(session_key=session_key)
+    return cart
 
 class CartView(generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [permissions.AllowAny]  # Allow anonymous users
     
     def get_object(self):
-        # Get or create cart based on session
+        # Reading never creates a session or a cart, AddToCartView does that
         session_key = self.request.session.session_key
         if not session_key:
-            self.request.session.create()
-            session_key = self.request.session.session_key
-            self.request.session.modified = True
-        
-        cart, created = Cart.objects.get_or_create(session_key=session_key)
-        return cart
+            return None
+        return Cart.objects.for_display().filter(session_key=session_key).first()
+    
+    def retrieve(self, request, *args, **kwargs):
+        cart = self.get_object()
+        if cart is None:
+            return Response(self.get_empty_cart_data())
+        serializer = self.get_serializer(cart)
+        return Response(serializer.data)
+    
+    def get_empty_cart_data(self):
+        """Same shape as a serialized cart, without touching the database"""
+        data = {name: None for name in self.get_serializer().fields}
+        data.update(items=[], total=0, session_key=self.request.session.session_key)
+        return data
 
 class AddToCartView(generics.CreateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.AllowAny]  # Allow anonymous users
     
     def create(self, request, *args, **kwargs):
-        # Get or create cart
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.create()
-            session_key = request.session.session_key
-            request.session.modified = True
-        
-        cart, created = Cart.objects.get_or_create(session_key=session_key)
+        cart = get_session_cart(request)
         
         # Add cart to request data
         request.data['cart'] = cart.id
         
-        # Check if similar item already exists in cart
-        product_id = request.data.get('product')
-        student_name = request.data.get('student_name')
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        # Increment the existing line for this product and student, or create it
+        validated_data = dict(serializer.validated_data)
+        measurements = pop_measurements(validated_data)
+        validated_data.pop('cart')
+        cart_item, created = CartItem.objects.add_or_increment(
+            cart,
+            validated_data.pop('product'),
+            quantity=validated_data.pop('quantity', 1),
+            student_name=validated_data.pop('student_name', None),
+            measurements=measurements,
+            **validated_data
+        )
+        
+        serializer = self.get_serializer(cart_item)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class BulkAddToCartView(generics.GenericAPIView):
+    serializer_class = BulkAddToCartSerializer
+    permission_classes = [permissions.AllowAny]  # Allow anonymous users
+    
+    def post(self, request, *args, **kwargs):
+        # Validate the whole batch before touching the session or the cart
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         
-        existing_item = CartItem.objects.filter(
-            cart=cart, 
-            product_id=product_id, 
-            student_name=student_name
-        ).first()
+        cart = get_session_cart(request)
+        created = CartItem.objects.add_many(cart, serializer.validated_data['items'])
         
-        if existing_item:
-            # Update quantity if item exists
-            existing_item.quantity += int(request.data.get('quantity', 1))
-            
-            # Update measurements if provided
-            measurement_fields = [
-                'bust_chest', 'waist', 'hips', 'shoulder_width', 'sleeve_length',
-                'front_length', 'back_length', 'inseam', 'outseam', 'thigh', 'knee',
-                'neck', 'shirt_length', 'skirt_length', 'dress_length'
-            ]
-            
-            measurements = {}
-            for field in measurement_fields:
-                if field in request.data and request.data[field] not in [None, '']:
-                    # Convert to float for JSON serialization
-                    try:
-                        measurements[field] = float(request.data[field])
-                    except (ValueError, TypeError):
-                        pass
-            
-            if measurements:
-                if existing_item.measurements:
-                    existing_item.measurements.update(measurements)
-                else:
-                    existing_item.measurements = measurements
-            
-            existing_item.save()
-            serializer = self.get_serializer(existing_item)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            # Create new item
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        cart = Cart.objects.for_display().get(pk=cart.pk)
+        return Response(
+            CartSerializer(cart, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
 class UpdateCartItemView(generics.UpdateAPIView):
     queryset = CartItem.objects.all()
@@ -98,7 +103,29 @@ class UpdateCartItemView(generics.UpdateAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        return super().update(request, *args, **kwargs)
+        serializer = self.get_serializer(cart_item, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # The edit moved the item onto a line the cart already has for that product
+            # and student, fold it into that line the way adding it again would
+            return Response(self.get_serializer(self.merge_into_existing_line(cart_item)).data)
+        return Response(serializer.data)
+    
+    def merge_into_existing_line(self, cart_item):
+        # cart_item carries the edited values, the failed save left them in place
+        with transaction.atomic():
+            merged, _ = CartItem.objects.add_or_increment(
+                cart_item.cart,
+                cart_item.product,
+                quantity=cart_item.quantity,
+                student_name=cart_item.student_name,
+                measurements=cart_item.measurements,
+            )
+            CartItem.objects.filter(pk=cart_item.pk).delete()
+        return merged
 
 class RemoveFromCartView(generics.DestroyAPIView):
     queryset = CartItem.objects.all()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+SCHOOLS_SCOPE = 'schools'
+
+
+def school_scope(school_id):
+    return f'school:{school_id}'
+
+
+def _version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def get_version(scope):
+    """Return the current version number for a catalog scope"""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version key never reuses an old number
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    """Invalidate every cached payload of a catalog scope"""
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+class CatalogCacheMixin:
+    """
+    Read-through cache for public catalog GET endpoints.
+
+    Payloads are stored under the version of the view's catalog scope, so a
+    version bump from the model signals makes every stale entry unreachable.
+    """
+
+    def get_catalog_scope(self):
+        raise NotImplementedError
+
+    def get_catalog_cache_key(self):
+        scope = self.get_catalog_scope()
+        # Image URLs in the payload are absolute, so they differ by scheme and host
+        return 'catalog:%s:v%s:%s:%s://%s' % (
+            scope,
+            get_version(scope),
+            self.__class__.__name__,
+            self.request.scheme,
+            self.request.get_host(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_catalog_cache_key()
+        entry = cache.get(key)
+
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+            entry = {'etag': compute_etag(data), 'data': data}
+            cache.set(key, entry, CATALOG_CACHE_TIMEOUT)
+
+        etag = entry['etag']
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or etag in etags or f'W/{etag}' in etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        return Response(entry['data'], headers={'ETag': etag})
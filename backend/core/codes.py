@@ -0,0 +1,187 @@
+import hashlib
+import secrets
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import CodeSequence
+
+# Crockford base32: no I, L, O or U, so a code survives being read out over the phone
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+BASE = len(ALPHABET)
+VALUES = {char: value for value, char in enumerate(ALPHABET)}
+
+# Seven data characters (32**7, about 34 billion codes) and one check character
+CODE_DIGITS = 7
+CODE_SPACE = BASE ** CODE_DIGITS
+
+ORDER_CODE_SEQUENCE = 'order_code'
+ORDER_CODE_BLOCK_SIZE = getattr(settings, 'ORDER_CODE_BLOCK_SIZE', 100)
+
+# Feistel network over 36 bits, cycle-walked down to the 35-bit code space
+_HALF_BITS = 18
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def check_character(data):
+    """Luhn mod 32 check character, catches every single typo and most swapped neighbours"""
+    total = 0
+    factor = 2
+    for char in reversed(data):
+        addend = factor * VALUES[char]
+        total += addend // BASE + addend % BASE
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[-total % BASE]
+
+
+def is_valid_code(code):
+    code = (code or '').upper()
+    if len(code) != CODE_DIGITS + 1 or any(char not in VALUES for char in code):
+        return False
+    return check_character(code[:-1]) == code[-1]
+
+
+class CodePermutation:
+    """
+    Keyed bijection of the code space.
+
+    Sequence numbers go in and scrambled numbers come out, so consecutive
+    orders get unrelated codes while two numbers can never share one.
+    """
+
+    def __init__(self, key):
+        key = key.encode('utf-8') if isinstance(key, str) else key
+        self.round_keys = [
+            hashlib.blake2b(key, digest_size=32, salt=b'order-code-%d' % i).digest()
+            for i in range(_ROUNDS)
+        ]
+
+    def _round(self, round_key, half):
+        digest = hashlib.blake2b(half.to_bytes(3, 'big'), key=round_key, digest_size=4).digest()
+        return int.from_bytes(digest, 'big') & _HALF_MASK
+
+    def _forward(self, value):
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(round_key, right)
+        return left << _HALF_BITS | right
+
+    def _backward(self, value):
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_key in reversed(self.round_keys):
+            left, right = right ^ self._round(round_key, left), left
+        return left << _HALF_BITS | right
+
+    def scramble(self, number):
+        if not 0 <= number < CODE_SPACE:
+            raise ValueError(f'{number} is outside the code space')
+        # Walking the cycle keeps a permutation of 2**36 inside the 32**7 domain
+        number = self._forward(number)
+        while number >= CODE_SPACE:
+            number = self._forward(number)
+        return number
+
+    def unscramble(self, number):
+        number = self._backward(number)
+        while number >= CODE_SPACE:
+            number = self._backward(number)
+        return number
+
+
+def encode(number):
+    chars = []
+    for _ in range(CODE_DIGITS):
+        number, digit = divmod(number, BASE)
+        chars.append(ALPHABET[digit])
+    data = ''.join(reversed(chars))
+    return data + check_character(data)
+
+
+def decode(code):
+    number = 0
+    for char in code.upper()[:CODE_DIGITS]:
+        number = number * BASE + VALUES[char]
+    return number
+
+
+def reserve_block(name, size):
+    """Reserve `size` consecutive numbers of a sequence in one write, returns (start, end)"""
+    with transaction.atomic():
+        if not CodeSequence.objects.filter(name=name).update(next_value=F('next_value') + size):
+            CodeSequence.objects.get_or_create(name=name)
+            CodeSequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        end = CodeSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return end - size, end
+
+
+class BlockAllocator:
+    """
+    Hands out numbers of a database sequence from blocks reserved in advance.
+
+    Only one write per block reaches the database; threads of the process
+    share the current block under a lock.
+    """
+
+    def __init__(self, name, block_size):
+        self.name = name
+        self.block_size = block_size
+        self.next_value = self.end = 0
+        self.reservations = 0
+        self.lock = threading.Lock()
+
+    def allocate(self):
+        with self.lock:
+            if self.next_value >= self.end:
+                self.next_value, self.end = reserve_block(self.name, self.block_size)
+                self.reservations += 1
+            value = self.next_value
+            self.next_value += 1
+            return value
+
+    def discard(self):
+        """Drop the rest of the current block, e.g. after a rolled back reservation was reused"""
+        with self.lock:
+            self.next_value = self.end = 0
+
+
+class OrderCodeAllocator:
+    def __init__(self, key=None, block_size=None):
+        self.permutation = CodePermutation(key or settings.ORDER_CODE_KEY)
+        self.sequence = BlockAllocator(ORDER_CODE_SEQUENCE, block_size or ORDER_CODE_BLOCK_SIZE)
+
+    def next_code(self):
+        return encode(self.permutation.scramble(self.sequence.allocate()))
+
+    def discard_block(self):
+        self.sequence.discard()
+
+
+_order_codes = None
+_order_codes_lock = threading.Lock()
+
+
+def order_code_allocator():
+    global _order_codes
+    if _order_codes is None:
+        with _order_codes_lock:
+            if _order_codes is None:
+                _order_codes = OrderCodeAllocator()
+    return _order_codes
+
+
+def next_order_code():
+    """A new unique order code, e.g. '4KQ7ZP2M'"""
+    return order_code_allocator().next_code()
+
+
+def new_token(nbytes=48):
+    """URL-safe random token from the OS CSPRNG, 48 bytes make 64 characters"""
+    return secrets.token_urlsafe(nbytes)
+
+
+def token_digest(token):
+    """What gets stored and looked up instead of a token itself"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
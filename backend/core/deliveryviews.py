@@ -2,18 +2,28 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from .models import Shipment, DeliveryPartnerProfile
-from .serializers import ShipmentSerializer
+from .pagination import KeysetPagination
+from .queryplans import plan_queryset
+from .serializers import ShipmentFeedSerializer, ShipmentSerializer
 
 class DeliveryShipmentListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = ShipmentSerializer
+    serializer_class = ShipmentFeedSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        try:
-            delivery_profile = DeliveryPartnerProfile.objects.get(user=self.request.user)
-            return Shipment.objects.filter(delivery_partner=self.request.user)
-        except DeliveryPartnerProfile.DoesNotExist:
+        if not DeliveryPartnerProfile.objects.filter(user=self.request.user).exists():
             return Shipment.objects.none()
+        
+        queryset = Shipment.objects.filter(delivery_partner=self.request.user)
+        
+        # Optional filter: ?status=assigned,picked_up,in_transit
+        statuses = self.request.query_params.get('status')
+        if statuses:
+            queryset = queryset.filter(status__in=statuses.split(','))
+        
+        # Embeds the order and school summary without a query per shipment
+        return plan_queryset(queryset, self.get_serializer_class())
 
 class DeliveryShipmentUpdateView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .assignment import assign_order
+from .mailqueue import queue_mail
+from .models import Order
+from .reporting import record_status_change
+
+
+def confirm_paid_order(order_id):
+    """
+    Confirm a paid order, assign it to a tailor and queue the emails.
+
+    Shared by the payment views and the webhook worker, whichever learns of
+    the payment first; the conditional UPDATE lets only one of them move the
+    order out of 'pending'. Returns the order, or None if it was not pending.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, status='pending').update(status='confirmed', updated_at=timezone.now()):
+            return None
+        order = Order.objects.select_related('school').get(pk=order_id)
+        # A queryset update skips the post_save signals, so move the sales rollups here
+        record_status_change(order, 'pending', 'confirmed')
+
+        tailor, confirmation_token = assign_order(order)
+        if tailor:
+            send_tailor_notification(order, tailor, confirmation_token)
+        send_customer_confirmation(order)
+    return order
+
+
+def send_tailor_notification(order, tailor, confirmation_token):
+    """Send email notification to tailor about new order"""
+    subject = f'New Order Assignment - {order.order_code}'
+    
+    # Create confirmation URL
+    confirmation_url = f"{settings.FRONTEND_URL}/tailor/confirm-order/{confirmation_token}/"
+    
+    message = f'''
+    Hello {tailor.user.first_name} {tailor.user.last_name},
+    
+    You have been assigned a new school uniform order.
+    
+    Order Details:
+    - Order Code: {order.order_code}
+    - School: {order.school.name}
+    - Student: {order.student_name}
+    - Deadline: {order.deadline.strftime('%Y-%m-%d')}
+    
+    Please confirm that you will work on this order by clicking the link below:
+    {confirmation_url}
+    
+    You have 7 days to complete this order.
+    
+    Best regards,
+    The School Uniforms Team
+    '''
+    
+    queue_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [tailor.user.email]
+    )
+
+
+def send_customer_confirmation(order):
+    """Send confirmation email to customer"""
+    subject = f'Order Confirmation - {order.order_code}'
+    
+    message = f'''
+    Hello {order.customer_name},
+    
+    Thank you for your order. Your payment has been received and your order is being processed.
+    
+    Order Details:
+    - Order Code: {order.order_code}
+    - School: {order.school.name}
+    - Student: {order.student_name}
+    - Total Amount: ${order.total_amount}
+    
+    We will notify you once your order is ready for delivery.
+    
+    Best regards,
+    The School Uniforms Team
+    '''
+    
+    queue_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [order.customer_email]
+    )
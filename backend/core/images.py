@@ -0,0 +1,130 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .catalogcache import bump_version, school_scope
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Widths for the catalog grid at 1x, 2x and the product page
+PRODUCT_IMAGE_WIDTHS = getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (200, 400, 800))
+DERIVATIVE_DIR = 'products/derivatives'
+
+# Pillow format, file extension and save options per derivative format
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(digest, width, image_format):
+    return f'{DERIVATIVE_DIR}/{digest[:16]}-{width}w.{FORMATS[image_format][1]}'
+
+
+def build_derivatives(source_name, storage=None):
+    """
+    Write resized WebP and JPEG copies of a stored image, returns their metadata.
+
+    Names are derived from the source bytes, so an unchanged image maps to the
+    files already written and a replaced one can never be served from a stale
+    cache. Only touches storage, never the database, so it is safe to run in
+    worker processes.
+    """
+    storage = storage or default_storage
+    with storage.open(source_name, 'rb') as source:
+        content = source.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    with Image.open(io.BytesIO(content)) as original:
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    widths = sorted({min(width, image.width) for width in PRODUCT_IMAGE_WIDTHS})
+
+    derivatives = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image.copy()
+        for image_format, (pil_format, _, options) in FORMATS.items():
+            name = derivative_name(digest, width, image_format)
+            if not storage.exists(name):
+                mode = 'RGBA' if has_alpha and image_format == 'webp' else 'RGB'
+                buffer = io.BytesIO()
+                resized.convert(mode).save(buffer, pil_format, **options)
+                storage.save(name, ContentFile(buffer.getvalue()))
+            derivatives.append({'name': name, 'format': image_format, 'width': width, 'height': height})
+    return derivatives
+
+
+def store_derivatives(product_id, source_name, derivatives):
+    """Attach derivatives to a product, unless its image changed while they were built"""
+    updated = Product.objects.filter(pk=product_id, image=source_name).update(
+        image_derivatives=derivatives,
+        image_derivatives_source=source_name,
+    )
+    if updated:
+        school_id = Product.objects.filter(pk=product_id).values_list('school_id', flat=True).first()
+        bump_version(school_scope(school_id))
+    return bool(updated)
+
+
+def pending_products():
+    """Products with an image whose derivatives are missing or were built from an older file"""
+    return (
+        Product.objects
+        .exclude(image='')
+        .exclude(image__isnull=True)
+        .exclude(image_derivatives_source=F('image'))
+    )
+
+
+def process_product(product_id):
+    product = Product.objects.filter(pk=product_id).only('image').first()
+    if product is None or not product.image:
+        return False
+    return store_derivatives(product_id, product.image.name, build_derivatives(product.image.name))
+
+
+_executor = None
+
+
+def schedule_derivatives(product_id):
+    """Build a product's derivatives on a background thread, outside the upload request"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PRODUCT_IMAGE_THREADS', 2))
+    _executor.submit(_run_in_background, product_id)
+
+
+def _run_in_background(product_id):
+    try:
+        process_product(product_id)
+    except Exception:
+        # build_image_derivatives picks the product up again as pending
+        logger.exception('Building image derivatives failed for product %s', product_id)
+    finally:
+        connection.close()
+
+
+def srcset(derivatives, image_format, build_url):
+    return ', '.join(
+        f"{build_url(item['name'])} {item['width']}w"
+        for item in derivatives
+        if item['format'] == image_format
+    )
+
+
+def smallest(derivatives, image_format='jpeg'):
+    candidates = [item for item in derivatives or [] if item['format'] == image_format]
+    return min(candidates, key=lambda item: item['width']) if candidates else None
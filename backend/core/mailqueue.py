@@ -0,0 +1,122 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .metrics import external_call
+from .models import OutboundEmail
+
+MAIL_QUEUE_BATCH_SIZE = getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+MAIL_QUEUE_MAX_ATTEMPTS = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+MAIL_QUEUE_RETRY_DELAY = getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', 60)  # seconds, doubled per attempt
+MAIL_QUEUE_MAX_RETRY_DELAY = getattr(settings, 'MAIL_QUEUE_MAX_RETRY_DELAY', 60 * 60)
+MAIL_QUEUE_CLAIM_TIMEOUT = getattr(settings, 'MAIL_QUEUE_CLAIM_TIMEOUT', 10 * 60)  # seconds a worker may hold a batch
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """
+    Drop-in replacement for send_mail that stores the email in the outbox.
+
+    The row is written in the caller's transaction, so an email is only ever
+    sent for work that was actually committed. Run `manage.py send_queued_mail`
+    to deliver it.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email,
+        recipients=list(recipient_list),
+    )
+
+
+def _schedule_retry(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        delay = min(MAIL_QUEUE_RETRY_DELAY * 2 ** (email.attempts - 1), MAIL_QUEUE_MAX_RETRY_DELAY)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+
+
+def _claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails for this run and return them.
+
+    The claim is a conditional UPDATE, so when two workers pick the same rows
+    each row goes to only one of them. It is also a lease: a row left in
+    'sending' by a worker that died becomes due again once the lease runs out.
+    """
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    
+    token = uuid.uuid4()
+    claimed = due.filter(id__in=ids).update(
+        status='sending',
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=MAIL_QUEUE_CLAIM_TIMEOUT),
+    )
+    if not claimed:
+        return []
+    return list(OutboundEmail.objects.filter(id__in=ids, claim_token=token).order_by('id'))
+
+
+def deliver_batch(batch_size=MAIL_QUEUE_BATCH_SIZE, max_attempts=MAIL_QUEUE_MAX_ATTEMPTS):
+    """Claim one batch of due emails and send it over a single connection, returns (sent, failed)"""
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        with external_call('smtp', 'open'):
+            connection.open()
+    except Exception as e:
+        # The relay is unreachable, back off the whole batch
+        for email in batch:
+            _schedule_retry(email, e, max_attempts)
+        failed = len(batch)
+    else:
+        try:
+            for index, email in enumerate(batch):
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email, email.recipients, connection=connection
+                )
+                try:
+                    with external_call('smtp', 'send'):
+                        connection.send_messages([message])
+                except Exception as e:
+                    _schedule_retry(email, e, max_attempts)
+                    failed += 1
+                    # Carry on with a fresh connection in case this one is broken
+                    try:
+                        connection.close()
+                        with external_call('smtp', 'open'):
+                            connection.open()
+                    except Exception as e:
+                        for remaining in batch[index + 1:]:
+                            _schedule_retry(remaining, e, max_attempts)
+                            failed += 1
+                        break
+                else:
+                    email.status = 'sent'
+                    email.attempts += 1
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+                    sent += 1
+        finally:
+            connection.close()
+    
+    for email in batch:
+        email.claim_token = None
+    OutboundEmail.objects.bulk_update(
+        batch, ['status', 'attempts', 'next_attempt_at', 'claim_token', 'last_error', 'sent_at']
+    )
+    return sent, failed
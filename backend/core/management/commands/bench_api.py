@@ -0,0 +1,140 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from core.benchmarking import seed_benchmark_data, summarize, throwaway_database, timed_request
+from core.models import Order, Payment
+from core.paymentgateway import get_gateway
+
+SCENARIOS = ('catalog', 'cart_add', 'guest_checkout', 'payment_execute', 'tailor_orders', 'delivery_shipments')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Drive the hot API flows against a seeded throwaway database and print throughput, latency and queries as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--schools', type=int, default=10)
+        parser.add_argument('--orders-per-school', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Only run this scenario, may be repeated')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenario'] or SCENARIOS
+        # The throwaway test environment already swaps in the locmem mail backend
+        with throwaway_database(), override_settings(PAYMENT_GATEWAY='core.paymentgateway.FakeGateway'):
+            cache.clear()
+            self.data = seed_benchmark_data(options['schools'], options['orders_per_school'], options['seed'])
+            report = {
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'options': {key: options[key] for key in ('requests', 'schools', 'orders_per_school', 'seed')},
+                'scenarios': {
+                    name: self.run(getattr(self, f'scenario_{name}')(), options['requests'])
+                    for name in scenarios
+                },
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def run(self, step, total_requests):
+        """
+        Time total_requests calls of a scenario. step(i) does any untimed set-up
+        and returns the request to send; throughput is over the timed part only.
+        """
+        latencies, query_counts, errors = [], [], 0
+        for i in range(total_requests):
+            send = step(i)
+            response, duration, queries = timed_request(send)
+            latencies.append(duration)
+            query_counts.append(len(queries))
+            if response.status_code >= 400:
+                errors += 1
+        summary = summarize(latencies, sum(latencies), query_counts)
+        summary['errors'] = errors
+        return summary
+
+    def client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def scenario_catalog(self):
+        client = self.client()
+        schools = self.data['schools']
+
+        def step(i):
+            school = schools[i // 2 % len(schools)]
+            url = '/api/schools/' if i % 2 == 0 else f'/api/schools/{school.id}/products/'
+            return lambda: client.get(url)
+        return step
+
+    def scenario_cart_add(self):
+        shoppers = [self.client() for _ in range(20)]
+        products = self.data['products']
+
+        def step(i):
+            shopper = shoppers[i % len(shoppers)]
+            payload = {'product': products[i % len(products)].id, 'quantity': 1, 'student_name': f'Student {i % 3}'}
+            return lambda: shopper.post('/api/cart/add/', payload, format='json')
+        return step
+
+    def scenario_guest_checkout(self):
+        products = self.data['products']
+
+        def step(i):
+            shopper = self.client()
+            product = products[i % len(products)]
+            shopper.post('/api/cart/add/', {'product': product.id, 'quantity': 2, 'student_name': 'Student'}, format='json')
+            payload = {
+                'school': product.school_id,
+                'customer_name': 'Bench Parent',
+                'customer_phone': '0123456789',
+                'customer_email': 'parent@bench.test',
+            }
+            return lambda: shopper.post('/api/checkout/guest/', payload, format='json')
+        return step
+
+    def scenario_payment_execute(self):
+        customer = self.client(self.data['customer'])
+        schools = self.data['schools']
+
+        def step(i):
+            # An order that went through checkout and has a payment awaiting execution
+            payment = get_gateway().create_payment({'intent': 'sale'})
+            order = Order.objects.create(school=schools[i % len(schools)], total_amount=50)
+            Payment.objects.create(order=order, amount=50, method='paypal', status='pending', transaction_id=payment['id'])
+            payload = {'paymentID': payment['id'], 'payerID': 'BENCHPAYER'}
+            return lambda: customer.post('/api/payments/execute/', payload, format='json')
+        return step
+
+    def scenario_tailor_orders(self):
+        tailor = self.client(self.data['tailor'])
+        return lambda i: lambda: tailor.get('/api/tailor/orders/')
+
+    def scenario_delivery_shipments(self):
+        courier = self.client(self.data['courier'])
+        return lambda i: lambda: courier.get('/api/delivery/shipments/')
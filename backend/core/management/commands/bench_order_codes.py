@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarking import throwaway_database
+from core.codes import OrderCodeAllocator, decode, is_valid_code
+
+
+class Command(BaseCommand):
+    help = 'Issue order codes from several allocators sharing one sequence and check they never collide'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000, help='Codes to issue in total')
+        parser.add_argument('--workers', type=int, default=4, help='Allocators drawing from the sequence, as separate processes would')
+        parser.add_argument('--block-size', type=int, default=1000, help='Sequence numbers reserved per database write')
+
+    def handle(self, *args, **options):
+        count, workers = options['count'], options['workers']
+        with throwaway_database():
+            allocators = [
+                OrderCodeAllocator(key='benchmark', block_size=options['block_size'])
+                for _ in range(workers)
+            ]
+            seen = set()
+            collisions = invalid = 0
+            start = time.perf_counter()
+            for i in range(count):
+                code = allocators[i % workers].next_code()
+                if code in seen:
+                    collisions += 1
+                seen.add(code)
+            elapsed = time.perf_counter() - start
+
+            # Every code must carry a good check character and map back to a distinct number
+            permutation = allocators[0].permutation
+            numbers = set()
+            for code in seen:
+                if not is_valid_code(code):
+                    invalid += 1
+                numbers.add(permutation.unscramble(decode(code)))
+
+        result = {
+            'codes': count,
+            'workers': workers,
+            'block_size': options['block_size'],
+            'codes_per_sec': round(count / elapsed, 1) if elapsed else 0.0,
+            'database_reservations': sum(allocator.sequence.reservations for allocator in allocators),
+            'collisions': collisions,
+            'invalid_check_characters': invalid,
+            'sequence_numbers_recovered': len(numbers),
+        }
+        self.stdout.write(json.dumps(result, indent=2))
+        if collisions or invalid or len(numbers) != count:
+            raise CommandError('Order codes collided or failed validation.')
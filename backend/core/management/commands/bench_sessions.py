@@ -0,0 +1,68 @@
+import json
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from core.benchmarking import summarize, throwaway_database, timed_request
+from core.models import Product, School
+
+MODES = {
+    'before': {'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'SESSION_SAVE_EVERY_REQUEST': True},
+    'after': {'SESSION_ENGINE': 'core.sessions', 'SESSION_SAVE_EVERY_REQUEST': False},
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare session write volume and latency of the old and new session setup under catalog browsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Catalog requests per mode')
+        parser.add_argument('--visitors', type=int, default=20, help='Distinct shoppers with a session')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            school = School.objects.create(name='Benchmark High', address='1 Bench Rd', is_active=True)
+            for garment_type, _ in Product.GARMENT_TYPES:
+                Product.objects.create(school=school, garment_type=garment_type, price=Decimal('25.00'))
+            urls = [
+                '/api/schools/',
+                f'/api/schools/{school.id}/',
+                f'/api/schools/{school.id}/products/',
+            ]
+            results = {
+                mode: self.run_mode(mode_settings, urls, options['requests'], options['visitors'])
+                for mode, mode_settings in MODES.items()
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_mode(self, mode_settings, urls, total_requests, visitor_count):
+        cache.clear()
+        with override_settings(**mode_settings):
+            visitors = []
+            for _ in range(visitor_count):
+                client = Client()
+                # A shopper who has already put something in the session
+                session = client.session
+                session['cart_seen'] = True
+                session.save()
+                visitors.append(client)
+
+            latencies, session_writes = [], 0
+            start = time.perf_counter()
+            for i in range(total_requests):
+                client = visitors[i % visitor_count]
+                url = urls[i % len(urls)]
+                _, duration, queries = timed_request(lambda: client.get(url))
+                latencies.append(duration)
+                session_writes += sum(
+                    1 for query in queries
+                    if 'django_session' in query['sql'] and query['sql'].lstrip().upper().startswith(('UPDATE', 'INSERT'))
+                )
+            elapsed = time.perf_counter() - start
+
+        summary = summarize(latencies, elapsed)
+        summary['session_writes'] = session_writes
+        return summary
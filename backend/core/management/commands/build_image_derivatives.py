@@ -0,0 +1,51 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from core.images import build_derivatives, pending_products, store_derivatives
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG copies of product images, spreading the work over a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every product image, not just pending ones')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--loop', action='store_true', help='Keep running and pick up new uploads')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds to sleep between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            products = Product.objects.exclude(image='').exclude(image__isnull=True) if options['all'] else pending_products()
+            built = self.build(list(products.values_list('pk', 'image')), options['workers'])
+            self.stdout.write(self.style.SUCCESS(f'Built derivatives for {built} products'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def build(self, products, workers):
+        # Several products may share one uploaded file, resize each file once
+        by_source = {}
+        for product_id, source_name in products:
+            by_source.setdefault(source_name, []).append(product_id)
+        if not by_source:
+            return 0
+
+        built = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = {pool.submit(build_derivatives, source_name): source_name for source_name in by_source}
+            for future in as_completed(futures):
+                source_name = futures[future]
+                try:
+                    derivatives = future.result()
+                except Exception as e:
+                    self.stderr.write(f'Skipping {source_name}: {e}')
+                    continue
+                # Workers only write files, the database is updated from this process
+                for product_id in by_source[source_name]:
+                    built += store_derivatives(product_id, source_name, derivatives)
+        return built
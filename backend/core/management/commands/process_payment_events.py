@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.paymentevents import PAYMENT_EVENT_MAX_ATTEMPTS, process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Apply stored payment webhook events to payments and orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=PAYMENT_EVENT_MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            resolved = process_pending_events(options['batch_size'], options['max_attempts'])
+            total += resolved
+            if resolved:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} events resolved'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import OrderConfirmationToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired tailor confirmation tokens, in small batches so the database stays writable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        expired = OrderConfirmationToken.objects.filter(expires_at__lte=timezone.now())
+
+        deleted = 0
+        while True:
+            # Walks the expires_at index, oldest tokens first
+            ids = list(expired.order_by('expires_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += OrderConfirmationToken.objects.filter(pk__in=ids).delete()[0]
+            self.stdout.write(f'Deleted {deleted} expired tokens so far')
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {deleted} expired tokens deleted'))
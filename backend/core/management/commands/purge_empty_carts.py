@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Delete carts that have no items, in small batches so the database stays writable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--older-than-hours', type=int, default=24,
+                            help='Only delete carts not updated for this many hours')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        empty_carts = (
+            Cart.objects
+            .filter(updated_at__lt=cutoff)
+            .exclude(Exists(CartItem.objects.filter(cart=OuterRef('pk'))))
+        )
+
+        deleted = 0
+        while True:
+            ids = list(empty_carts.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            # Re-check emptiness in the delete itself in case an item was added meanwhile
+            deleted += empty_carts.filter(pk__in=ids).delete()[1].get('core.Cart', 0)
+            self.stdout.write(f'Deleted {deleted} empty carts so far')
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {deleted} empty carts deleted'))
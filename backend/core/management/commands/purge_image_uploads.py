@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ImageUpload
+from core.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked image uploads that have not moved for a while, along with their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        deleted = 0
+        for upload in ImageUpload.objects.filter(updated_at__lt=cutoff).iterator():
+            discard_upload(upload)
+            upload.delete()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Done: {deleted} stale uploads deleted'))
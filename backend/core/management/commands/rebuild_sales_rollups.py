@@ -0,0 +1,39 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reporting import order_date_range, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the sales rollup tables from order lines, a few days at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD), defaults to the first order')
+        parser.add_argument('--until', help='Last day to rebuild (YYYY-MM-DD), defaults to the last order')
+        parser.add_argument('--days-per-chunk', type=int, default=7)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        bounds = order_date_range()
+        if bounds is None:
+            self.stdout.write(self.style.SUCCESS('Done: no orders to roll up'))
+            return
+        try:
+            start = date.fromisoformat(options['since']) if options['since'] else bounds[0]
+            end = date.fromisoformat(options['until']) if options['until'] else bounds[1]
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        written = 0
+        chunk = timedelta(days=options['days_per_chunk'])
+        while start <= end:
+            # Each chunk is replaced in its own transaction, reports never see it half built
+            chunk_end = min(start + chunk - timedelta(days=1), end)
+            written += rebuild_rollups(start, chunk_end)
+            self.stdout.write(f'Rebuilt {start} to {chunk_end}, {written} rollup rows so far')
+            start = chunk_end + timedelta(days=1)
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {written} rollup rows written'))
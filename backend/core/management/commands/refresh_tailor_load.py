@@ -0,0 +1,20 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from core.models import Order, TailorProfile
+
+
+class Command(BaseCommand):
+    help = "Recount every tailor's open orders, e.g. after bulk status updates that bypass signals"
+
+    def handle(self, *args, **options):
+        open_counts = (
+            Order.objects
+            .filter(tailor=OuterRef('user'), status__in=Order.OPEN_STATUSES)
+            .values('tailor')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        updated = TailorProfile.objects.update(open_orders=Coalesce(Subquery(open_counts), 0))
+        self.stdout.write(self.style.SUCCESS(f'Recounted open orders for {updated} tailors'))
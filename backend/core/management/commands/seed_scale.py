@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time as datetime_time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.utils import timezone
+
+from core.models import Cart, Order, Product, School, TailorProfile
+from core.seeding import make_plan, seed_carts, seed_orders, seed_schools, seed_tailors
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic production-sized dataset: schools, products, tailors, '
+            'orders with lines and carts with measured items')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=2000)
+        parser.add_argument('--products-per-school', type=int, default=12, help='At most one per garment type')
+        parser.add_argument('--tailors', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=1000000, help='Orders, each with 1-4 lines')
+        parser.add_argument('--carts', type=int, default=300000)
+        parser.add_argument('--items-per-cart', type=int, default=3, help='Average items per cart')
+        parser.add_argument('--days', type=int, default=365, help='Spread creation dates over this many days')
+        parser.add_argument('--end-date', help='Last day of the spread (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT')
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help='Orders, carts, schools or tailors generated per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes generating chunks in parallel (not with SQLite)')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not rebuild sales rollups and tailor load afterwards')
+
+    def handle(self, *args, **options):
+        if options['schools'] < 1:
+            raise CommandError('At least one school is needed.')
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows one writer at a time, extra processes would only wait on the lock
+            self.stdout.write('SQLite only allows one writer, using a single process')
+            workers = 1
+
+        try:
+            end_day = date.fromisoformat(options['end_date']) if options['end_date'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+        end = timezone.make_aware(datetime.combine(end_day, datetime_time.max))
+
+        plan = make_plan(
+            options['schools'], options['products_per_school'], options['tailors'], options['orders'],
+            options['carts'], options['items_per_cart'], options['days'], end, options['seed'],
+        )
+        started = time.perf_counter()
+        # Products hang off schools and orders off products and tailors, so tables go in this order
+        for label, task, total in (
+            ('schools and products', seed_schools, plan['schools']),
+            ('tailors', seed_tailors, plan['tailors']),
+            ('orders and lines', seed_orders, plan['orders']),
+            ('carts and items', seed_carts, plan['carts']),
+        ):
+            rows = self.run(task, plan, total, options['chunk_size'], options['batch_size'], workers)
+            self.stdout.write(f'Wrote {rows} rows of {label} ({time.perf_counter() - started:.1f}s)')
+
+        # Rows were inserted with explicit keys, move the sequences past them
+        statements = connection.ops.sequence_reset_sql(no_style(), [School, Product, User, TailorProfile, Order, Cart])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        if not options['skip_derived']:
+            # bulk_create skips the signals that keep these current
+            call_command('rebuild_sales_rollups', days_per_chunk=31, pause=0, stdout=self.stdout)
+            call_command('refresh_tailor_load', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(f'Done: seeded in {time.perf_counter() - started:.1f}s'))
+
+    def run(self, task, plan, total, chunk_size, batch_size, workers):
+        chunks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+        if workers <= 1:
+            return sum(task(plan, start, stop, batch_size) for start, stop in chunks)
+
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        rows = 0
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks) or 1), initializer=django.setup) as pool:
+            futures = [pool.submit(task, plan, start, stop, batch_size) for start, stop in chunks]
+            for future in as_completed(futures):
+                rows += future.result()
+        return rows
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mailqueue import MAIL_QUEUE_BATCH_SIZE, MAIL_QUEUE_MAX_ATTEMPTS, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAIL_QUEUE_BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=MAIL_QUEUE_MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_batch(options['batch_size'], options['max_attempts'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_sent} sent, {total_failed} failed'))
@@ -0,0 +1,214 @@
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Seconds; wide enough for a 1 ms cache hit and a 10 s PayPal timeout
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        # Snapshot under the lock, inc() from another thread must not resize the dict mid-iteration
+        with self.lock:
+            values = sorted(self.values.items())
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in values:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        # Copy the bucket lists too, observe() updates them in place
+        with self.lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.values.items())
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                yield f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + (le,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+def _labels(names, values):
+    pairs = ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{%s}' % pairs if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUESTS = Counter('http_requests_total', 'Requests handled, by endpoint, method and status code.',
+                   ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                            ('endpoint', 'method'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQL queries run per request.',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram('http_request_db_seconds', 'Time per request spent in SQL queries.',
+                            ('endpoint',))
+REQUEST_EXTERNAL_TIME = Histogram('http_request_external_seconds', 'Time per request spent calling external services.',
+                                  ('endpoint', 'service'))
+EXTERNAL_LATENCY = Histogram('external_call_duration_seconds', 'Latency of calls to external services.',
+                             ('service', 'operation'))
+EXTERNAL_ERRORS = Counter('external_call_errors_total', 'Calls to external services that raised.',
+                          ('service', 'operation'))
+
+REGISTRY = (REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_EXTERNAL_TIME,
+            EXTERNAL_LATENCY, EXTERNAL_ERRORS)
+
+
+def render_metrics():
+    """Every metric of this process in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        with metric.lock:
+            metric.values.clear()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'external')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.external = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the length of a request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+_current_request = ContextVar('metrics_request', default=None)
+
+
+@contextmanager
+def external_call(service, operation):
+    """Time a call to PayPal, SMTP or another outside service"""
+    if not metrics_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.inc((service, operation))
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        EXTERNAL_LATENCY.observe((service, operation), elapsed)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.external[service] = stats.external.get(service, 0.0) + elapsed
+
+
+class InstrumentedGateway:
+    """Wraps a payment gateway so every call it makes is timed"""
+
+    def __init__(self, gateway, service='paypal'):
+        self.gateway = gateway
+        self.service = service
+
+    def __getattr__(self, name):
+        attribute = getattr(self.gateway, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with external_call(self.service, name):
+                return attribute(*args, **kwargs)
+        return call
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count and time, and external call time per endpoint.
+
+    Removed from the middleware chain altogether when METRICS_ENABLED is off.
+    """
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match else None) or 'unmatched'
+        REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+        REQUEST_LATENCY.observe((endpoint, request.method), elapsed)
+        REQUEST_QUERIES.observe((endpoint,), stats.queries)
+        REQUEST_DB_TIME.observe((endpoint,), stats.db_time)
+        for service, seconds in stats.external.items():
+            REQUEST_EXTERNAL_TIME.observe((endpoint, service), seconds)
+        return response
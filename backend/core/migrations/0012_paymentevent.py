@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('resource_id', models.CharField(blank=True, default='', help_text='Gateway payment id the event refers to', max_length=100)),
+                ('payload', models.JSONField()),
+                ('event_created_at', models.DateTimeField(blank=True, help_text='When the gateway created the event', null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'event_created_at'], name='core_payevent_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_paymentevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tailorprofile',
+            name='open_orders',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_tailorprofile_open_orders'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['school', 'status', 'created_at'], name='core_order_school_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['tailor', 'status', 'deadline'], name='core_order_tailor_due_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_order_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['delivery_partner', 'status', 'created_at'], name='core_shipment_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:47
+
+from django.db import migrations, models
+import django.db.models.functions
+import django.db.models.functions.comparison
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold duplicate cart lines into the oldest one before the constraint is added"""
+    CartItem = apps.get_model('core', 'CartItem')
+    student_key = models.functions.Coalesce('student_name', models.Value(''))
+    duplicates = (
+        CartItem.objects
+        .annotate(student_key=student_key)
+        .values('cart_id', 'product_id', 'student_key')
+        .annotate(lines=models.Count('id'))
+        .filter(lines__gt=1)
+    )
+    for group in list(duplicates):
+        items = list(
+            CartItem.objects
+            .annotate(student_key=student_key)
+            .filter(cart_id=group['cart_id'], product_id=group['product_id'], student_key=group['student_key'])
+            .order_by('id')
+        )
+        first = items[0]
+        for item in items[1:]:
+            first.quantity += item.quantity
+            if item.measurements:
+                first.measurements = {**(first.measurements or {}), **item.measurements}
+        first.save(update_fields=['quantity', 'measurements'])
+        CartItem.objects.filter(id__in=[item.id for item in items[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_shipment_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(models.F('cart'), models.F('product'), django.db.models.functions.comparison.Coalesce(models.F('student_name'), models.Value('')), name='core_cartitem_unique_student_line'),
+        ),
+    ]
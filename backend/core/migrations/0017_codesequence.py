@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_cartitem_unique_student_line'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
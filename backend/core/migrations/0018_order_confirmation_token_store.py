@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def hash_existing_tokens(apps, schema_editor):
+    """Carry outstanding plaintext tokens over as digests so sent links keep working"""
+    Order = apps.get_model('core', 'Order')
+    OrderConfirmationToken = apps.get_model('core', 'OrderConfirmationToken')
+    ttl = getattr(settings, 'TAILOR_CONFIRMATION_TOKEN_TTL', 7 * 24 * 60 * 60)
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    orders = Order.objects.exclude(confirmation_token__isnull=True).exclude(confirmation_token='')
+    OrderConfirmationToken.objects.bulk_create([
+        OrderConfirmationToken(
+            order_id=order_id,
+            digest=hashlib.sha256(token.encode('utf-8')).hexdigest(),
+            expires_at=expires_at,
+        )
+        for order_id, token in orders.values_list('id', 'confirmation_token').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_codesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderConfirmationToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='confirmation', to='core.order')),
+            ],
+        ),
+        migrations.RunPython(hash_existing_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='order',
+            name='confirmation_token',
+        ),
+    ]
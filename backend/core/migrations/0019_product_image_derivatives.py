@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-17 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_order_confirmation_token_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_derivatives_source',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
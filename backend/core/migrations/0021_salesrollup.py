@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-17 16:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_imageupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('garment_type', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='core.school')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'day'], name='core_salesrollup_school_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'school', 'garment_type', 'status'), name='core_salesrollup_unique_key'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_salesrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='session_key',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='core_order_status_idx'),
+        ),
+        # Email verification and registration look users up by email; auth_user
+        # belongs to django.contrib.auth, so its index is added here
+        migrations.RunSQL(
+            'CREATE INDEX core_auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX core_auth_user_email_idx',
+        ),
+    ]
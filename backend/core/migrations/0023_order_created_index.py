@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='core_order_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, help_text='Worker run that claimed the row for sending', null=True),
+        ),
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
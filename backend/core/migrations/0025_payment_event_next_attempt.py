@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_outbound_email_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
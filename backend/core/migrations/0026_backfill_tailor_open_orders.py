@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 18:10
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Order.OPEN_STATUSES when the counter was added
+OPEN_STATUSES = ('confirmed', 'in_production')
+
+
+def count_open_orders(apps, schema_editor):
+    # 0013 added open_orders as 0 for everyone, which made tailors with work look idle
+    Order = apps.get_model('core', 'Order')
+    TailorProfile = apps.get_model('core', 'TailorProfile')
+    open_counts = (
+        Order.objects
+        .filter(tailor=OuterRef('user'), status__in=OPEN_STATUSES)
+        .values('tailor')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    TailorProfile.objects.update(open_orders=Coalesce(Subquery(open_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_payment_event_next_attempt'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_open_orders, migrations.RunPython.noop),
+    ]
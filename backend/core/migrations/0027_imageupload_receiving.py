@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_backfill_tailor_open_orders'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('receiving', 'Receiving a chunk'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=20),
+        ),
+    ]
@@ -1,10 +1,16 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, DecimalField, F, Func, JSONField, Prefetch, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+import operator
 import random
 import string
 import json
+import uuid
+from functools import reduce
 
 class School(models.Model):
     name = models.CharField(max_length=255)
@@ -33,6 +39,9 @@ class Product(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='products')
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # Resized copies written by core.images, and the image file they were built from
+    image_derivatives = models.JSONField(default=list, blank=True)
+    image_derivatives_source = models.CharField(max_length=255, blank=True, default='')
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     garment_type = models.CharField(max_length=20, choices=GARMENT_TYPES, null=True, blank=True)
     available_sizes = models.JSONField(help_text="Standard sizes available (S, M, L, XL, etc.)", null=True, blank=True)
@@ -41,19 +50,159 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.school.name} - {self.get_garment_type_display()}"
 
+def _money(expression):
+    return Coalesce(expression, Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+class JSONMerge(Func):
+    """Shallow-merge a JSON object into a JSON column (RFC 7396 merge patch) in SQL"""
+    function = 'JSON_MERGE_PATCH'
+    output_field = JSONField()
+    
+    def __init__(self, expression, patch, **extra):
+        super().__init__(
+            Coalesce(expression, Value('{}'), output_field=models.TextField()),
+            Value(json.dumps(patch)),
+            **extra
+        )
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_PATCH', **extra_context)
+    
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(%(expressions)s::jsonb)', arg_joiner='::jsonb || ', **extra_context)
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate line_total (quantity x product price) computed in the database"""
+        return self.annotate(line_total=_money(F('quantity') * F('product__price')))
+    
+    def add_or_increment(self, cart, product, quantity=1, student_name=None, measurements=None, **fields):
+        """
+        Add quantity to the cart line for this product and student, creating it if needed.
+        
+        An existing line is incremented and its measurements merged in a single
+        UPDATE, so concurrent adds never lose an increment. A concurrent insert
+        of the same line trips the unique constraint and is retried as an update.
+        Returns (item, created).
+        """
+        if student_name:
+            same_student = Q(student_name=student_name)
+        else:
+            same_student = Q(student_name__isnull=True) | Q(student_name='')
+        line = self.filter(same_student, cart=cart, product=product)
+        
+        updates = {'quantity': F('quantity') + quantity}
+        if measurements:
+            updates['measurements'] = JSONMerge('measurements', measurements)
+        
+        for attempt in range(2):
+            if line.update(**updates):
+                return line.get(), False
+            try:
+                with transaction.atomic():
+                    return self.create(
+                        cart=cart,
+                        product=product,
+                        quantity=quantity,
+                        student_name=student_name,
+                        measurements=measurements or None,
+                        **fields
+                    ), True
+            except IntegrityError:
+                if attempt:
+                    raise
+
+    def add_many(self, cart, lines):
+        """
+        Add several lines to a cart in one go, returns how many new lines were created.
+        
+        Lines for the same product and student are combined first. Existing lines
+        are incremented and their measurements merged in one UPDATE, with the
+        same F() and JSON merge expressions as add_or_increment, so concurrent
+        adds never lose an increment. The rest are written with one bulk_create;
+        lines a concurrent request inserted first are incremented instead.
+        """
+        merged = {}
+        for line in lines:
+            key = (line['product'].pk, line.get('student_name') or '')
+            if key in merged:
+                merged[key]['quantity'] += line.get('quantity', 1)
+                merged[key]['measurements'].update(line.get('measurements') or {})
+            else:
+                merged[key] = dict(line, quantity=line.get('quantity', 1), measurements=dict(line.get('measurements') or {}))
+        
+        with transaction.atomic():
+            pending = merged
+            for attempt in range(2):
+                existing = {
+                    (product_id, student_name or '')
+                    for product_id, student_name in self.filter(cart=cart, product__in={key[0] for key in pending})
+                    .values_list('product_id', 'student_name')
+                } & set(pending)
+                if existing:
+                    self._increment(cart, {key: pending[key] for key in existing})
+                missing = {key: line for key, line in pending.items() if key not in existing}
+                if not missing:
+                    return 0
+                try:
+                    with transaction.atomic():
+                        self.bulk_create([
+                            self.model(cart=cart, **dict(line, measurements=line['measurements'] or None))
+                            for line in missing.values()
+                        ])
+                    return len(missing)
+                except IntegrityError:
+                    if attempt:
+                        raise
+                    pending = missing
+    
+    def _increment(self, cart, lines):
+        """Add each line's quantity and measurements to its existing cart line, in one UPDATE"""
+        def same_line(key):
+            product_id, student_name = key
+            if student_name:
+                return Q(product_id=product_id, student_name=student_name)
+            return Q(product_id=product_id) & (Q(student_name__isnull=True) | Q(student_name=''))
+        
+        conditions = {key: same_line(key) for key in lines}
+        quantities = [When(conditions[key], then=Value(line['quantity'])) for key, line in lines.items()]
+        merges = [
+            When(conditions[key], then=JSONMerge('measurements', line['measurements']))
+            for key, line in lines.items() if line['measurements']
+        ]
+        updates = {'quantity': F('quantity') + Case(*quantities, default=Value(0))}
+        if merges:
+            updates['measurements'] = Case(*merges, default=F('measurements'), output_field=JSONField())
+        self.filter(reduce(operator.or_, conditions.values()), cart=cart).update(**updates)
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate items_total, the cart total computed in the database"""
+        return self.annotate(items_total=_money(Sum(F('items__quantity') * F('items__product__price'))))
+    
+    def for_display(self):
+        """Everything CartSerializer reads, in two queries"""
+        items = CartItem.objects.with_totals().select_related('product__school')
+        return self.with_totals().prefetch_related(Prefetch('items', queryset=items))
+
 class Cart(models.Model):
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    # Every cart view and checkout look the cart up by session
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CartQuerySet.as_manager()
+    
     def __str__(self):
         if self.user:
             return f"Cart for {self.user.username}"
         return f"Anonymous Cart ({self.session_key})"
     
     def get_total(self):
-        return sum(item.get_total() for item in self.items.all())
+        if hasattr(self, 'items_total'):
+            return self.items_total
+        return self.items.aggregate(total=_money(Sum(F('quantity') * F('product__price'))))['total']
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -69,10 +218,23 @@ class CartItem(models.Model):
     measurements = models.JSONField(null=True, blank=True, help_text="Body measurements in cm")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = CartItemQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            # One line per product and student; a missing name counts as ''
+            models.UniqueConstraint(
+                F('cart'), F('product'), Coalesce(F('student_name'), Value('')),
+                name='core_cartitem_unique_student_line',
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.quantity} x {self.product} for {self.student_name or 'Unknown Student'}"
     
     def get_total(self):
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.product.price * self.quantity if self.product.price else 0
 
 class Order(models.Model):
@@ -111,22 +273,88 @@ class Order(models.Model):
     # Order assignment and deadline fields
     assigned_at = models.DateTimeField(null=True, blank=True)
     deadline = models.DateTimeField(null=True, blank=True)
-    confirmation_token = models.CharField(max_length=64, blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            # Tailor order feed: orders of a tailor's schools, newest first. With one school
+            # this index serves the filter and the sort together
+            models.Index(fields=['school', 'status', 'created_at'], name='core_order_school_feed_idx'),
+            # With several schools the rows come from several ranges of the index above and
+            # would have to be sorted; this one walks the feed order (-created_at, -id)
+            # directly and stops once a page of matching rows is found
+            models.Index(fields=['created_at', 'id'], name='core_order_created_idx'),
+            models.Index(fields=['tailor', 'status', 'deadline'], name='core_order_tailor_due_idx'),
+            # Orders by status across all schools, e.g. the admin status filter
+            models.Index(fields=['status', 'created_at'], name='core_order_status_idx'),
+        ]
     
     def __str__(self):
         return self.order_code or f"Order {self.id}"
     
+    # Statuses in which an order counts towards its tailor's workload
+    OPEN_STATUSES = ('confirmed', 'in_production')
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.order_code:
+            return super().save(*args, **kwargs)
+        
+        from .codes import order_code_allocator
+        allocator = order_code_allocator()
+        for attempt in range(3):
+            self.order_code = allocator.next_code()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # The code is taken: by a random code from before the sequence, by one issued
+                # under an earlier ORDER_CODE_KEY, or from a rolled back block handed out again
+                if attempt == 2:
+                    raise
+                allocator.discard_block()
+    
     def generate_confirmation_token(self):
-        """Generate a unique confirmation token"""
-        token = ''.join(random.choices(string.ascii_letters + string.digits, k=64))
-        self.confirmation_token = token
-        self.save()
-        return token
+        """Issue a new tailor confirmation token, replacing any earlier one, returns the plaintext token"""
+        return OrderConfirmationToken.objects.issue(self)
     
-    def set_deadline(self):
+    def set_deadline(self, commit=True):
         """Set deadline to 7 days from now"""
         self.deadline = timezone.now() + timezone.timedelta(days=7)
-        self.save()
+        if commit:
+            self.save()
+
+class ConfirmationTokenQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+    
+    def issue(self, order, ttl=None):
+        """Store the digest of a new token for the order, returns the plaintext token"""
+        from .codes import new_token, token_digest
+        token = new_token()
+        ttl = ttl or getattr(settings, 'TAILOR_CONFIRMATION_TOKEN_TTL', 7 * 24 * 60 * 60)
+        fields = {
+            'digest': token_digest(token),
+            'expires_at': timezone.now() + timezone.timedelta(seconds=ttl),
+        }
+        if not self.filter(order=order).update(**fields):
+            self.create(order=order, **fields)
+        return token
+    
+    def resolve(self, token):
+        """Active tokens matching a plaintext token, found through the unique digest index"""
+        from .codes import token_digest
+        return self.active().filter(digest=token_digest(token))
+
+class OrderConfirmationToken(models.Model):
+    """Tailor confirmation link of an order, stored as a SHA-256 digest of the token"""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='confirmation')
+    digest = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ConfirmationTokenQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"Confirmation token for {self.order}"
 
 class OrderLine(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines', null=True, blank=True)
@@ -161,6 +389,8 @@ class TailorProfile(models.Model):
     email_verification_code = models.CharField(max_length=6, blank=True, null=True)
     is_email_verified = models.BooleanField(default=False)
     business_name = models.CharField(max_length=255, blank=True, null=True)
+    # Orders currently assigned and open, maintained by core.signals
+    open_orders = models.PositiveIntegerField(default=0, db_index=True)
     
     def __str__(self):
         return self.user.username if self.user else f"TailorProfile {self.id}"
@@ -217,6 +447,12 @@ class Shipment(models.Model):
     delivered_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Delivery partner shipment feed, newest first
+            models.Index(fields=['delivery_partner', 'status', 'created_at'], name='core_shipment_feed_idx'),
+        ]
+    
     def __str__(self):
         return f"Shipment for {self.order.order_code if self.order else 'No Order'}"
 
@@ -229,10 +465,125 @@ class Payment(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     method = models.CharField(max_length=50, choices=PAYMENT_METHODS, default='paypal')
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    # Gateway payment id, payment execution and status look payments up by it
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Payment for {self.order.order_code if self.order else 'No Order'}"
\ No newline at end of file
+        return f"Payment for {self.order.order_code if self.order else 'No Order'}"
+
+class CodeSequence(models.Model):
+    """Counter behind core.codes, reserved in blocks so issuing a code rarely writes"""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
+
+class ImageUpload(models.Model):
+    """A chunked product image upload, see core.uploads"""
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('receiving', 'Receiving a chunk'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total size in bytes")
+    sha256 = models.CharField(max_length=64, help_text="Expected SHA-256 of the whole file")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size}, {self.status})"
+
+class SalesRollup(models.Model):
+    """
+    Sales per day, school, garment type and order status, kept current by core.reporting.
+    
+    Rows with an empty garment_type hold whole-order totals, so order counts
+    are exact when a report is not split by garment.
+    """
+    day = models.DateField()
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, related_name='sales_rollups')
+    garment_type = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'school', 'garment_type', 'status'], name='core_salesrollup_unique_key'),
+        ]
+        indexes = [
+            models.Index(fields=['school', 'day'], name='core_salesrollup_school_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.school_id} {self.garment_type or 'all'} {self.status}: {self.units} units"
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False, help_text="Worker run that claimed the row for sending")
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+class PaymentEvent(models.Model):
+    """Webhook events as delivered by the payment gateway, one row per event id"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+    
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    resource_id = models.CharField(max_length=100, blank=True, default='', help_text="Gateway payment id the event refers to")
+    payload = models.JSONField()
+    event_created_at = models.DateTimeField(null=True, blank=True, help_text="When the gateway created the event")
+    received_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'event_created_at'], name='core_payevent_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over (created_at, id), newest first.
+
+    Each page is an indexed range scan from the cursor position, so fetching
+    page 100 costs the same as page 1 however large the table gets.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fulfilment import confirm_paid_order
+from .models import Payment, PaymentEvent
+
+PAYMENT_EVENT_MAX_ATTEMPTS = 10
+PAYMENT_EVENT_RETRY_DELAY = 30  # seconds, doubled per attempt
+PAYMENT_EVENT_MAX_RETRY_DELAY = 60 * 60
+
+# Gateway event type -> payment status it moves the payment to
+EVENT_PAYMENT_STATUS = {
+    'PAYMENTS.PAYMENT.CREATED': 'pending',
+    'PAYMENT.SALE.PENDING': 'pending',
+    'PAYMENT.SALE.COMPLETED': 'completed',
+    'PAYMENT.SALE.DENIED': 'failed',
+    'PAYMENT.SALE.REFUNDED': 'refunded',
+    'PAYMENT.SALE.REVERSED': 'refunded',
+}
+
+# Payments only ever move forward, so a replayed or late event can never undo a newer one
+PAYMENT_STATUS_RANK = {
+    'pending': 0,
+    'completed': 1,
+    'failed': 1,
+    'refunded': 2,
+}
+
+
+def record_event(event):
+    """
+    Store a verified webhook event, returns (event, created).
+
+    Deliveries are deduplicated on the gateway's event id, so a replay is
+    a no-op that still gets acknowledged.
+    """
+    resource = event.get('resource') or {}
+    try:
+        with transaction.atomic():
+            return PaymentEvent.objects.create(
+                event_id=event['id'],
+                event_type=event.get('event_type', ''),
+                resource_id=resource.get('parent_payment') or resource.get('id') or '',
+                payload=event,
+                event_created_at=parse_datetime(event.get('create_time') or '') or timezone.now(),
+            ), True
+    except IntegrityError:
+        return PaymentEvent.objects.get(event_id=event['id']), False
+
+
+def apply_event(event):
+    """Apply one event to its Payment and Order, returns the new event status"""
+    new_status = EVENT_PAYMENT_STATUS.get(event.event_type)
+    if new_status is None:
+        return 'ignored'
+
+    with transaction.atomic():
+        payment = (
+            Payment.objects.select_for_update()
+            .select_related('order')
+            .filter(transaction_id=event.resource_id)
+            .first()
+        )
+        if payment is None:
+            # Checkout and PaymentInitiateView store the payment before sending the customer
+            # to PayPal, so it is either still being committed or not one of ours; retry with
+            # backoff and give up after max_attempts
+            raise Payment.DoesNotExist(f'No payment with transaction id {event.resource_id}')
+
+        if PAYMENT_STATUS_RANK.get(new_status, 0) <= PAYMENT_STATUS_RANK.get(payment.status, 0):
+            return 'ignored'
+
+        payment.status = new_status
+        payment.save(update_fields=['status', 'updated_at'])
+
+        order = payment.order
+        if order is not None:
+            if new_status == 'completed':
+                # Same path as the payment views, a no-op if one of them got there first
+                confirm_paid_order(order.pk)
+            elif new_status == 'failed' and order.status == 'pending':
+                order.status = 'cancelled'
+                order.save(update_fields=['status', 'updated_at'])
+
+    return 'processed'
+
+
+def process_pending_events(batch_size=100, max_attempts=PAYMENT_EVENT_MAX_ATTEMPTS):
+    """Apply due pending events in gateway creation order, returns how many were resolved"""
+    events = list(
+        PaymentEvent.objects
+        .filter(status='pending', next_attempt_at__lte=timezone.now())
+        .order_by('event_created_at', 'id')[:batch_size]
+    )
+    resolved = 0
+    for event in events:
+        event.attempts += 1
+        try:
+            event.status = apply_event(event)
+            event.processed_at = timezone.now()
+            event.last_error = ''
+        except Exception as e:
+            event.last_error = str(e)
+            if event.attempts >= max_attempts:
+                event.status = 'failed'
+            else:
+                # Back off so an event that keeps failing does not hold up the batches after it
+                delay = min(PAYMENT_EVENT_RETRY_DELAY * 2 ** (event.attempts - 1), PAYMENT_EVENT_MAX_RETRY_DELAY)
+                event.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        event.save(update_fields=['status', 'attempts', 'next_attempt_at', 'processed_at', 'last_error'])
+        if event.status != 'pending':
+            resolved += 1
+    return resolved
@@ -0,0 +1,236 @@
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from .metrics import InstrumentedGateway, metrics_enabled
+
+PAYPAL_API_URLS = {
+    'sandbox': 'https://api.sandbox.paypal.com',
+    'live': 'https://api.paypal.com',
+}
+
+
+class PaymentGatewayError(Exception):
+    """Raised when the payment gateway rejects a call or cannot be reached"""
+
+    def __init__(self, message, status_code=None, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details or {}
+
+
+class CircuitOpenError(PaymentGatewayError):
+    """Raised without calling out while the gateway is considered unhealthy"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row calls fail fast for
+    `reset_timeout` seconds, then a single trial call is let through while
+    every other call keeps failing fast until the trial succeeds or fails.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # When the half-open trial call was let through, None while there is none
+        self.trial_started_at = None
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Payment gateway is temporarily unavailable.')
+            # A trial that never reported back counts as lost after another reset_timeout
+            if self.trial_started_at is not None and now - self.trial_started_at < self.reset_timeout:
+                raise CircuitOpenError('Payment gateway is temporarily unavailable.')
+            # Half-open: this call is the trial
+            self.trial_started_at = now
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_started_at is not None or self.failures >= self.failure_threshold:
+                # A failed trial re-opens the circuit for another reset_timeout
+                self.opened_at = time.monotonic()
+                self.trial_started_at = None
+
+
+class PayPalGateway:
+    """
+    PayPal REST client for the v1 payments API.
+
+    One instance is shared per process: it keeps a pooled HTTPS session,
+    caches the OAuth access token until shortly before it expires, applies
+    a timeout to every call and trips a circuit breaker when PayPal fails.
+    """
+
+    def __init__(self, mode=None, client_id=None, client_secret=None, timeout=None,
+                 failure_threshold=None, reset_timeout=None):
+        mode = mode or settings.PAYPAL_MODE
+        self.base_url = PAYPAL_API_URLS[mode]
+        self.client_id = client_id or settings.PAYPAL_CLIENT_ID
+        self.client_secret = client_secret or settings.PAYPAL_CLIENT_SECRET
+        self.timeout = timeout or getattr(settings, 'PAYPAL_TIMEOUT', (3.05, 10))
+        self.breaker = CircuitBreaker(
+            failure_threshold or getattr(settings, 'PAYPAL_CIRCUIT_FAILURE_THRESHOLD', 5),
+            reset_timeout or getattr(settings, 'PAYPAL_CIRCUIT_RESET_TIMEOUT', 30),
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=getattr(settings, 'PAYPAL_POOL_SIZE', 10))
+        self.session.mount('https://', adapter)
+
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+
+    def _send(self, method, path, **kwargs):
+        self.breaker.before_call()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise PaymentGatewayError(f'PayPal request failed: {e}')
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            # 4xx means PayPal is up and answered, it just refused this call
+            self.breaker.record_success()
+        return response
+
+    def _access_token(self, force_refresh=False):
+        with self._token_lock:
+            # Refresh a minute early so a token never expires mid-request
+            if force_refresh or self._token is None or time.monotonic() >= self._token_expires_at - 60:
+                response = self._send(
+                    'POST', '/v1/oauth2/token',
+                    data={'grant_type': 'client_credentials'},
+                    auth=(self.client_id, self.client_secret),
+                    headers={'Accept': 'application/json'},
+                )
+                if response.status_code != 200:
+                    raise PaymentGatewayError('PayPal authentication failed.', response.status_code, _json(response))
+                data = response.json()
+                self._token = data['access_token']
+                self._token_expires_at = time.monotonic() + int(data.get('expires_in', 0))
+            return self._token
+
+    def _call(self, method, path, payload=None):
+        headers = {'Content-Type': 'application/json'}
+        if method == 'POST':
+            headers['PayPal-Request-Id'] = str(uuid.uuid4())
+
+        for attempt in range(2):
+            headers['Authorization'] = f'Bearer {self._access_token(force_refresh=attempt > 0)}'
+            response = self._send(method, path, json=payload, headers=headers)
+            # A revoked or expired token gets one retry with a fresh one
+            if response.status_code != 401:
+                break
+
+        if response.status_code >= 400:
+            details = _json(response)
+            raise PaymentGatewayError(
+                details.get('message', 'PayPal request was rejected.'), response.status_code, details
+            )
+        return response.json()
+
+    def create_payment(self, payment):
+        return self._call('POST', '/v1/payments/payment', payment)
+
+    def find_payment(self, payment_id):
+        return self._call('GET', f'/v1/payments/payment/{payment_id}')
+
+    def execute_payment(self, payment_id, payer_id):
+        return self._call('POST', f'/v1/payments/payment/{payment_id}/execute', {'payer_id': payer_id})
+
+    def verify_webhook(self, headers, event):
+        """Ask PayPal whether a webhook delivery really came from it"""
+        result = self._call('POST', '/v1/notifications/verify-webhook-signature', {
+            'auth_algo': headers.get('PAYPAL-AUTH-ALGO'),
+            'cert_url': headers.get('PAYPAL-CERT-URL'),
+            'transmission_id': headers.get('PAYPAL-TRANSMISSION-ID'),
+            'transmission_sig': headers.get('PAYPAL-TRANSMISSION-SIG'),
+            'transmission_time': headers.get('PAYPAL-TRANSMISSION-TIME'),
+            'webhook_id': settings.PAYPAL_WEBHOOK_ID,
+            'webhook_event': event,
+        })
+        return result.get('verification_status') == 'SUCCESS'
+
+
+class FakeGateway:
+    """In-memory stand-in for PayPal, used by tests and local development"""
+
+    def __init__(self):
+        self.payments = {}
+
+    def create_payment(self, payment):
+        payment_id = f'PAYID-{uuid.uuid4().hex[:20].upper()}'
+        self.payments[payment_id] = dict(payment, id=payment_id, state='created')
+        return dict(self.payments[payment_id], links=[
+            {'rel': 'approval_url', 'href': f'https://paypal.test/approve/{payment_id}', 'method': 'REDIRECT'},
+        ])
+
+    def find_payment(self, payment_id):
+        if payment_id not in self.payments:
+            raise PaymentGatewayError('Payment not found.', 404)
+        return self.payments[payment_id]
+
+    def execute_payment(self, payment_id, payer_id):
+        payment = self.find_payment(payment_id)
+        payment.update(state='approved', payer={'payer_info': {'payer_id': payer_id}})
+        return payment
+
+    def verify_webhook(self, headers, event):
+        return bool(headers.get('PAYPAL-TRANSMISSION-ID'))
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway configured by settings.PAYMENT_GATEWAY"""
+    path = getattr(settings, 'PAYMENT_GATEWAY', 'core.paymentgateway.PayPalGateway')
+    gateway = _gateways.get(path)
+    if gateway is None:
+        with _gateways_lock:
+            gateway = _gateways.get(path)
+            if gateway is None:
+                gateway = _gateways[path] = import_string(path)()
+    if metrics_enabled():
+        return InstrumentedGateway(gateway)
+    return gateway
+
+
+def approval_url(payment):
+    for link in payment.get('links', []):
+        if link.get('rel') == 'approval_url':
+            return link.get('href')
+    return None
@@ -1,19 +1,14 @@
 # core/paymentviews.py
-import paypalrestsdk
 from django.conf import settings
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Payment, Order
+from .fulfilment import confirm_paid_order
+from .paymentevents import record_event
+from .paymentgateway import CircuitOpenError, PaymentGatewayError, approval_url, get_gateway
 from .serializers import PaymentSerializer
 
-# Configure PayPal SDK
-paypalrestsdk.configure({
-    "mode": settings.PAYPAL_MODE,
-    "client_id": settings.PAYPAL_CLIENT_ID,
-    "client_secret": settings.PAYPAL_CLIENT_SECRET
-})
-
 class PaymentInitiateView(APIView):
     def post(self, request, *args, **kwargs):
         order_id = request.data.get('order_id')
@@ -28,42 +23,45 @@ class PaymentInitiateView(APIView):
             )
         
         # Create PayPal payment
-        payment = paypalrestsdk.Payment({
-            "intent": "sale",
-            "payer": {
-                "payment_method": "paypal"
-            },
-            "redirect_urls": {
-                "return_url": f"{settings.FRONTEND_URL}/payment/success/",
-                "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel/"
-            },
-            "transactions": [{
-                "amount": {
-                    "total": str(order.total_amount),
-                    "currency": "USD"
+        try:
+            payment = get_gateway().create_payment({
+                "intent": "sale",
+                "payer": {
+                    "payment_method": "paypal"
                 },
-                "description": f"Payment for order {order.order_code}"
-            }]
-        })
+                "redirect_urls": {
+                    "return_url": f"{settings.FRONTEND_URL}/payment/success/",
+                    "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel/"
+                },
+                "transactions": [{
+                    "amount": {
+                        "total": str(order.total_amount),
+                        "currency": "USD"
+                    },
+                    "description": f"Payment for order {order.order_code}"
+                }]
+            })
+        except CircuitOpenError as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except PaymentGatewayError:
+            payment = {}
         
-        if payment.create():
+        # Find approval URL
+        url = approval_url(payment)
+        if url:
             # Store payment in database
             payment_record = Payment.objects.create(
                 order=order,
                 amount=order.total_amount,
                 method="paypal",
                 status="pending",
-                transaction_id=payment.id
+                transaction_id=payment["id"]
             )
             
-            # Find approval URL
-            for link in payment.links:
-                if link.rel == "approval_url":
-                    approval_url = link.href
-                    return Response({
-                        "payment_id": payment.id,
-                        "approval_url": approval_url
-                    }, status=status.HTTP_200_OK)
+            return Response({
+                "payment_id": payment["id"],
+                "approval_url": url
+            }, status=status.HTTP_200_OK)
         
         return Response(
             {"error": "Failed to create PayPal payment."},
@@ -76,29 +74,34 @@ class PaymentExecuteView(APIView):
         payer_id = request.data.get('payerID')
         
         try:
-            payment = paypalrestsdk.Payment.find(payment_id)
+            # Execute payment, a rejected execution raises PaymentGatewayError
+            get_gateway().execute_payment(payment_id, payer_id)
             
-            if payment.execute({"payer_id": payer_id}):
-                # Update payment status in database
-                payment_record = Payment.objects.get(transaction_id=payment_id)
-                payment_record.status = "completed"
-                payment_record.save()
-                
-                # Update order status
-                order = payment_record.order
-                order.status = "confirmed"
-                order.save()
-                
-                return Response({
-                    "status": "Payment completed successfully.",
-                    "order_code": order.order_code
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response(
-                    {"error": "Payment execution failed."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # Update payment status in database
+            payment_record = Payment.objects.select_related('order').get(transaction_id=payment_id)
+            payment_record.status = "completed"
+            payment_record.save()
+            
+            # Confirm and assign the order and send the notifications, unless the
+            # payment webhook already did
+            order = payment_record.order
+            confirm_paid_order(order.pk)
+            
+            return Response({
+                "status": "Payment completed successfully.",
+                "order_code": order.order_code
+            }, status=status.HTTP_200_OK)
                 
+        except CircuitOpenError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except PaymentGatewayError:
+            return Response(
+                {"error": "Payment execution failed."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Payment.DoesNotExist:
             return Response(
                 {"error": "Payment record not found."},
@@ -128,10 +131,33 @@ class PaymentStatusView(APIView):
             )
 
 class PaymentWebhookView(APIView):
-    # This would handle payment gateway webhooks
+    # Handles payment gateway webhooks
     permission_classes = []  # No authentication for webhooks
+    authentication_classes = []
     
     def post(self, request, *args, **kwargs):
-        # Process webhook data from PayPal
-        # This is a placeholder implementation
-        return Response({"status": "webhook received"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        event = request.data
+        if not isinstance(event, dict) or not event.get('id'):
+            return Response(
+                {"error": "Invalid webhook event."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            verified = get_gateway().verify_webhook(request.headers, event)
+        except PaymentGatewayError:
+            # Let the gateway redeliver once verification is possible again
+            return Response(
+                {"error": "Unable to verify webhook."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        if not verified:
+            return Response(
+                {"error": "Webhook verification failed."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Store only, `manage.py process_payment_events` applies it
+        record_event(event)
+        return Response({"status": "webhook received"}, status=status.HTTP_200_OK)
@@ -1,15 +1,22 @@
 # core/productsviews.py
-from rest_framework import generics, permissions
-from .models import Product, School
-from .serializers import ProductSerializer
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from .catalogcache import CatalogCacheMixin, school_scope
+from .models import ImageUpload, Product, School
+from .serializers import ImageUploadSerializer, ProductSerializer
+from .uploads import CHUNKED_UPLOAD_MAX_CHUNK, UploadError, append_chunk, claim_chunk, discard_upload, finish_upload
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CatalogCacheMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = []  # Public access
     
     def get_queryset(self):
         school_id = self.kwargs['school_id']
-        return Product.objects.filter(school_id=school_id)
+        return Product.objects.filter(school_id=school_id).select_related('school')
+    
+    def get_catalog_scope(self):
+        return school_scope(self.kwargs['school_id'])
 
 class ProductManagementView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAdminUser]
@@ -19,4 +26,72 @@ class ProductManagementView(generics.RetrieveUpdateDestroyAPIView):
 class ProductCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAdminUser]
     queryset = Product.objects.all()
-    serializer_class = ProductSerializer
\ No newline at end of file
+    serializer_class = ProductSerializer
+
+class ProductImageUploadCreateView(generics.CreateAPIView):
+    """Start a chunked image upload for a product"""
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = ImageUploadSerializer
+    
+    def perform_create(self, serializer):
+        product = get_object_or_404(Product, pk=self.kwargs['pk'])
+        serializer.save(product=product, created_by=self.request.user)
+
+class ImageUploadView(generics.RetrieveDestroyAPIView):
+    """
+    GET reports how far an upload got, PATCH appends the next chunk.
+    
+    A chunk is the raw request body, sent with an Upload-Offset header equal
+    to the current offset, so a client resumes a dropped upload by asking
+    for the offset and sending from there.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    queryset = ImageUpload.objects.all()
+    serializer_class = ImageUploadSerializer
+    parser_classes = []  # Chunks are streamed from the request, never parsed
+    
+    def patch(self, request, *args, **kwargs):
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset and Content-Length headers are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < length <= CHUNKED_UPLOAD_MAX_CHUNK:
+            return Response({"error": f"Chunks must be between 1 and {CHUNKED_UPLOAD_MAX_CHUNK} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        upload = get_object_or_404(ImageUpload.objects.select_related('product'), pk=kwargs['pk'])
+        if upload.status not in ('uploading', 'receiving'):
+            return Response({"error": f"Upload is {upload.status}."}, status=status.HTTP_409_CONFLICT)
+        if offset != upload.offset:
+            return Response({"error": "Upload-Offset does not match.", "offset": upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        if offset + length > upload.size:
+            return Response({"error": "Chunk runs past the declared size."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Only one request at a time may append, whoever claims the chunk first
+        if not claim_chunk(upload, offset):
+            upload.refresh_from_db(fields=['offset'])
+            return Response({"error": "Another chunk of this upload is being received.", "offset": upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        
+        upload.status = 'uploading'
+        try:
+            upload.offset = append_chunk(upload, request.stream, length)
+            if upload.offset == upload.size:
+                finish_upload(upload)
+                upload.status = 'complete'
+        except UploadError as e:
+            if e.status_code == 422:
+                upload.status = 'failed'
+            return Response({"error": str(e)}, status=e.status_code)
+        finally:
+            # Hand the claim back, with the offset moved on only for a whole chunk
+            upload.save(update_fields=['status', 'offset', 'updated_at'])
+        
+        return Response(self.get_serializer(upload).data)
+    
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+        instance.delete()
@@ -0,0 +1,98 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _walk_source(model, source_attrs, prefix, select_related):
+    """Follow forward FK/one-to-one hops of a dotted source into select_related paths"""
+    path = prefix
+    for attr in source_attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # Methods and properties such as get_garment_type_display
+            return
+        if not field.is_relation or not (field.many_to_one or field.one_to_one):
+            return
+        path = f'{path}__{attr}' if path else attr
+        select_related.add(path)
+        model = field.related_model
+
+
+def build_plan(serializer_class, model=None):
+    """
+    Derive (select_related, prefetch_related) for a serializer from its fields.
+
+    Dotted sources that cross forward relations become select_related paths,
+    nested many serializers and many related fields become Prefetch objects
+    whose querysets are planned recursively from the child serializer.
+    """
+    serializer = serializer_class() if isinstance(serializer_class, type) else serializer_class
+    model = model or serializer.Meta.model
+    select_related = set()
+    prefetch_related = []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        source_attrs = field.source.split('.')
+
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            try:
+                relation = model._meta.get_field(source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            related_model = relation.related_model
+            queryset = related_model._default_manager.all()
+            if isinstance(field, serializers.ListSerializer):
+                queryset = plan_queryset(queryset, field.child)
+            prefetch_related.append(Prefetch(source_attrs[0], queryset=queryset))
+            continue
+
+        if isinstance(field, serializers.Serializer):
+            # Nested single object: join it and whatever it reads in turn
+            try:
+                relation = model._meta.get_field(source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if len(source_attrs) > 1 or not (relation.many_to_one or relation.one_to_one):
+                continue
+            select_related.add(relation.name)
+            nested_select, nested_prefetch = build_plan(field, relation.related_model)
+            select_related.update(f'{relation.name}__{path}' for path in nested_select)
+            for prefetch in nested_prefetch:
+                prefetch.add_prefix(relation.name)
+                prefetch_related.append(prefetch)
+            continue
+
+        # The final attribute of a RelatedField only needs the FK column
+        if isinstance(field, serializers.RelatedField) and len(source_attrs) == 1:
+            continue
+
+        _walk_source(model, source_attrs, '', select_related)
+
+    # Drop paths that are prefixes of longer ones
+    paths = sorted(select_related)
+    select_related = [
+        path for path in paths
+        if not any(other.startswith(path + '__') for other in paths)
+    ]
+    return select_related, prefetch_related
+
+
+def plan_queryset(queryset, serializer_class):
+    """Apply the query plan of a serializer to a queryset"""
+    select_related, prefetch_related = build_plan(serializer_class, queryset.model)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class PlannedQuerysetMixin:
+    """Generic view mixin that plans get_queryset() from the view's serializer"""
+
+    def get_queryset(self):
+        return plan_queryset(super().get_queryset(), self.get_serializer_class())
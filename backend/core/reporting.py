@@ -0,0 +1,174 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderLine, Payment, SalesRollup
+
+# Orders are counted once they leave 'pending', i.e. once they have been paid for
+UNREPORTED_STATUSES = ('pending',)
+
+# A cancelled order only counts if it was paid first, abandoned checkouts never sold anything
+CANCELLED_STATUS = 'cancelled'
+PAID_PAYMENT_STATUSES = ('completed', 'refunded')
+
+ALL_GARMENTS = ''
+
+_line_revenue = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def order_contributions(order_id):
+    """{garment_type: (units, revenue)} for one order plus its whole-order totals under '', in one query"""
+    rows = (
+        OrderLine.objects
+        .filter(order_id=order_id)
+        .values('product__garment_type')
+        .annotate(units=Sum('quantity'), revenue=Sum(_line_revenue))
+    )
+    contributions = {}
+    for row in rows:
+        contributions[row['product__garment_type'] or 'other'] = (row['units'] or 0, row['revenue'] or Decimal('0'))
+    if not contributions:
+        # An order without lines has sold nothing, the rebuild skips it too
+        return contributions
+    contributions[ALL_GARMENTS] = (
+        sum(units for units, _ in contributions.values()),
+        sum((revenue for _, revenue in contributions.values()), Decimal('0')),
+    )
+    return contributions
+
+
+def _by_garment(contributions, index, sign, output_field):
+    """The signed units (index 0) or revenue (index 1) of each garment type, as one CASE over garment_type"""
+    return Case(
+        *[When(garment_type=garment_type, then=Value(sign * values[index])) for garment_type, values in contributions.items()],
+        default=Value(0), output_field=output_field,
+    )
+
+
+def _apply(day, school_id, status, contributions, sign):
+    """Add (sign 1) or take away (sign -1) an order's contributions, in the same few queries however many garments"""
+    rows = SalesRollup.objects.filter(day=day, school_id=school_id, status=status)
+    pending = contributions
+    for attempt in range(2):
+        # Taking away only ever touches rows an earlier add created
+        existing = set(pending) if sign < 0 else set(
+            rows.filter(garment_type__in=pending).values_list('garment_type', flat=True)
+        )
+        if existing:
+            rows.filter(garment_type__in=existing).update(
+                orders=F('orders') + sign,
+                units=F('units') + _by_garment(pending, 0, sign, IntegerField()),
+                revenue=F('revenue') + _by_garment(pending, 1, sign, DecimalField(max_digits=14, decimal_places=2)),
+            )
+        missing = {garment_type: values for garment_type, values in pending.items() if garment_type not in existing}
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                SalesRollup.objects.bulk_create([
+                    SalesRollup(day=day, school_id=school_id, garment_type=garment_type, status=status,
+                                orders=1, units=units, revenue=revenue)
+                    for garment_type, (units, revenue) in missing.items()
+                ])
+            return
+        except IntegrityError:
+            # Another order created some of them first, add to those on the second pass
+            if attempt:
+                raise
+            pending = missing
+
+
+def _was_paid(order):
+    return Payment.objects.filter(order_id=order.pk, status__in=PAID_PAYMENT_STATUSES).exists()
+
+
+def _counted(order, status):
+    if status is None or status in UNREPORTED_STATUSES:
+        return False
+    # Only cancellations need to look at the payment
+    return status != CANCELLED_STATUS or _was_paid(order)
+
+
+def record_status_change(order, old_status, new_status):
+    """Move an order's sales from its old status bucket to the new one"""
+    counted_before = _counted(order, old_status)
+    counted_after = _counted(order, new_status)
+    if not (counted_before or counted_after):
+        return
+
+    day = timezone.localdate(order.created_at)
+    contributions = order_contributions(order.pk)
+    with transaction.atomic():
+        if counted_before:
+            _apply(day, order.school_id, old_status, contributions, -1)
+        if counted_after:
+            _apply(day, order.school_id, new_status, contributions, 1)
+
+
+def counted_order(order_id):
+    """The order if its sales are in the rollups, else None"""
+    order = Order.objects.filter(pk=order_id).only('school', 'status', 'created_at').first()
+    if order is None or not _counted(order, order.status):
+        return None
+    return order
+
+
+def replace_contributions(order, before, after):
+    """Swap a counted order's old contributions for new ones after its lines changed"""
+    if before == after:
+        return
+    day = timezone.localdate(order.created_at)
+    with transaction.atomic():
+        if before:
+            _apply(day, order.school_id, order.status, before, -1)
+        if after:
+            _apply(day, order.school_id, order.status, after, 1)
+
+
+def rebuild_rollups(start, end):
+    """Recompute the rollups of orders created on days start..end (inclusive), returns rows written"""
+    # A plain range on created_at can use an index; __date would convert every row first
+    lines = (
+        OrderLine.objects
+        .filter(
+            order__created_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+            order__created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        )
+        .exclude(order__status__in=UNREPORTED_STATUSES)
+        .exclude(Q(order__status=CANCELLED_STATUS) & ~Q(order__payment__status__in=PAID_PAYMENT_STATUSES))
+        .annotate(day=TruncDate('order__created_at'))
+    )
+    rollups = [
+        SalesRollup(
+            day=row['day'], school_id=row['order__school'], garment_type=row['product__garment_type'] or 'other',
+            status=row['order__status'], orders=row['orders'], units=row['units'] or 0, revenue=row['revenue'] or 0,
+        )
+        for row in lines.values('day', 'order__school', 'product__garment_type', 'order__status').annotate(
+            orders=Count('order', distinct=True), units=Sum('quantity'), revenue=Sum(_line_revenue),
+        )
+    ]
+    rollups += [
+        SalesRollup(
+            day=row['day'], school_id=row['order__school'], garment_type=ALL_GARMENTS,
+            status=row['order__status'], orders=row['orders'], units=row['units'] or 0, revenue=row['revenue'] or 0,
+        )
+        for row in lines.values('day', 'order__school', 'order__status').annotate(
+            orders=Count('order', distinct=True), units=Sum('quantity'), revenue=Sum(_line_revenue),
+        )
+    ]
+    with transaction.atomic():
+        SalesRollup.objects.filter(day__gte=start, day__lte=end).delete()
+        SalesRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def order_date_range():
+    """First and last day with an order, or None when there are no orders"""
+    bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if bounds['first'] is None:
+        return None
+    return timezone.localdate(bounds['first']), timezone.localdate(bounds['last'])
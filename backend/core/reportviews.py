@@ -0,0 +1,78 @@
+# core/reportviews.py
+from django.db.models import Sum
+from django.http import HttpResponse
+from rest_framework import generics, permissions, views
+from rest_framework.response import Response
+from .metrics import render_metrics
+from .models import SalesRollup
+from .reporting import ALL_GARMENTS
+from .serializers import SalesReportQuerySerializer
+
+# Rollup columns behind each group_by value
+GROUP_FIELDS = {
+    'day': ('day',),
+    'school': ('school', 'school__name'),
+    'garment_type': ('garment_type',),
+    'status': ('status',),
+}
+
+class SalesReportView(generics.GenericAPIView):
+    """
+    Sales totals from the rollup tables, never from orders.
+    
+    The work depends on the number of days, schools and garment types in the
+    answer, not on how many orders were placed.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = SalesReportQuerySerializer
+    
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        
+        rollups = SalesRollup.objects.filter(day__gte=params['date_from'], day__lte=params['date_to'])
+        if 'school' in params:
+            rollups = rollups.filter(school_id=params['school'])
+        if 'status' in params:
+            rollups = rollups.filter(status=params['status'])
+        
+        # Whole-order rows give exact order counts, garment rows are only read when asked for
+        whole_orders = rollups.filter(garment_type=ALL_GARMENTS)
+        per_garment = rollups.exclude(garment_type=ALL_GARMENTS)
+        if 'garment_type' in params:
+            per_garment = per_garment.filter(garment_type=params['garment_type'])
+            whole_orders = per_garment
+        
+        group_by = params['group_by']
+        rows = per_garment if 'garment_type' in group_by else whole_orders
+        fields = [field for group in group_by for field in GROUP_FIELDS[group]]
+        metrics = {'orders': Sum('orders'), 'units': Sum('units'), 'revenue': Sum('revenue')}
+        
+        return Response({
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            'group_by': group_by,
+            'totals': self.clean(whole_orders.aggregate(**metrics)),
+            'rows': [
+                self.clean(row) for row in
+                rows.values(*fields).annotate(**metrics).order_by(*fields)
+            ] if fields else [],
+        })
+    
+    def clean(self, row):
+        row = {key.replace('school__name', 'school_name'): value for key, value in row.items()}
+        for metric in ('orders', 'units', 'revenue'):
+            row[metric] = row.get(metric) or 0
+        return row
+
+
+class MetricsView(views.APIView):
+    """
+    Request, database and external call metrics of this process, in the
+    Prometheus text format. Collected only while METRICS_ENABLED is on.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
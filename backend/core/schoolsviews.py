@@ -1,17 +1,24 @@
 # core/schoolsviews.py
 from rest_framework import generics, permissions
+from .catalogcache import CatalogCacheMixin, SCHOOLS_SCOPE, school_scope
 from .models import School
 from .serializers import SchoolSerializer
 
-class SchoolListView(generics.ListAPIView):
+class SchoolListView(CatalogCacheMixin, generics.ListAPIView):
     queryset = School.objects.filter(is_active=True)
     serializer_class = SchoolSerializer
     permission_classes = []  
+    
+    def get_catalog_scope(self):
+        return SCHOOLS_SCOPE
 
-class SchoolDetailView(generics.RetrieveAPIView):
+class SchoolDetailView(CatalogCacheMixin, generics.RetrieveAPIView):
     queryset = School.objects.filter(is_active=True)
     serializer_class = SchoolSerializer
     permission_classes = [] 
+    
+    def get_catalog_scope(self):
+        return school_scope(self.kwargs['pk'])
 
 class SchoolManagementView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAdminUser]
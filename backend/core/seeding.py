@@ -0,0 +1,219 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+
+from .codes import ORDER_CODE_SEQUENCE, CodePermutation, encode, reserve_block
+from .models import Cart, CartItem, Order, OrderLine, Product, School, TailorProfile
+from .serializers import MEASUREMENT_FIELDS
+
+GARMENT_TYPES = [garment_type for garment_type, _ in Product.GARMENT_TYPES]
+GRADES = ['Grade R'] + [f'Grade {grade}' for grade in range(1, 13)]
+TOWNS = ('Johannesburg', 'Pretoria', 'Durban', 'Cape Town', 'Gqeberha', 'Bloemfontein', 'Polokwane', 'Mbombela')
+FIRST_NAMES = ('Thabo', 'Lerato', 'Sipho', 'Ayanda', 'Naledi', 'Pieter', 'Anika', 'Zanele', 'Kagiso', 'Megan')
+SURNAMES = ('Nkosi', 'Dlamini', 'van der Merwe', 'Mokoena', 'Botha', 'Naidoo', 'Khumalo', 'Smith', 'Mahlangu')
+
+# Heavier on finished orders, as a shop that has been trading for a while would be
+ORDER_STATUSES = (
+    ('pending', 5), ('confirmed', 5), ('in_production', 10), ('completed', 10),
+    ('shipped', 10), ('delivered', 55), ('cancelled', 5),
+)
+TAILORS_PER_SCHOOL = 2
+
+
+def make_plan(schools, products_per_school, tailors, orders, carts, items_per_cart, days, end, seed):
+    """
+    Sizes, first primary keys and order code sequence numbers of a run.
+
+    Every row's key and content follow from the plan, the seed and its
+    position alone, so chunks can be generated in any order, in any size and
+    by any number of processes and always produce the same data.
+    """
+    def next_id(model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    return {
+        'seed': seed,
+        'schools': schools,
+        'products_per_school': min(products_per_school, len(GARMENT_TYPES)),
+        'tailors': tailors,
+        'orders': orders,
+        'carts': carts,
+        'items_per_cart': items_per_cart,
+        'days': days,
+        'end': end,
+        'school_base': next_id(School),
+        'product_base': next_id(Product),
+        'user_base': next_id(User),
+        'tailor_base': next_id(TailorProfile),
+        'order_base': next_id(Order),
+        'cart_base': next_id(Cart),
+        # Codes come from the shared sequence, so they never clash with live orders
+        'order_code_base': reserve_block(ORDER_CODE_SEQUENCE, orders)[0] if orders else 0,
+    }
+
+
+def _rng(plan, table, index):
+    # str seeds hash deterministically, unlike tuples under PYTHONHASHSEED
+    return random.Random(f"{plan['seed']}:{table}:{index}")
+
+
+def _timestamp(plan, rng):
+    return plan['end'] - timedelta(seconds=rng.randrange(plan['days'] * 24 * 60 * 60))
+
+
+def _school_id(plan, index):
+    return plan['school_base'] + index
+
+
+def _product_id(plan, school_index, garment_index):
+    return plan['product_base'] + school_index * plan['products_per_school'] + garment_index
+
+
+def _tailor_indexes(plan, school_index):
+    tailors = plan['tailors']
+    return sorted({(school_index * 7 + offset * 13) % tailors for offset in range(TAILORS_PER_SCHOOL)}) if tailors else []
+
+
+def _price(plan, school_index, garment_index):
+    # Derived rather than stored, so order lines in other chunks agree with the product
+    rng = _rng(plan, 'price', school_index * 100 + garment_index)
+    return Decimal(rng.randrange(8000, 65000, 50)) / 100
+
+
+def _student(rng):
+    return {
+        'student_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}',
+        'student_age': rng.randint(5, 18),
+        'student_grade': rng.choice(GRADES),
+        'student_gender': rng.choice(('male', 'female')),
+        'student_height': Decimal(rng.randint(1050, 1900)) / 10,
+    }
+
+
+def _measurements(rng):
+    return {field: rng.randint(20, 110) for field in rng.sample(MEASUREMENT_FIELDS, rng.randint(4, 8))}
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at values it is given instead of stamping now()"""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def seed_schools(plan, start, stop, batch_size):
+    schools = []
+    products = []
+    for index in range(start, stop):
+        rng = _rng(plan, 'schools', index)
+        town = rng.choice(TOWNS)
+        schools.append(School(
+            id=_school_id(plan, index), name=f'{town} School {index + 1}', address=f'{rng.randint(1, 400)} Main Road',
+            town=town, is_active=rng.random() < 0.95, created_at=_timestamp(plan, rng),
+        ))
+        for garment_index in range(plan['products_per_school']):
+            products.append(Product(
+                id=_product_id(plan, index, garment_index), school_id=_school_id(plan, index),
+                garment_type=GARMENT_TYPES[garment_index], price=_price(plan, index, garment_index),
+                available_sizes=['XS', 'S', 'M', 'L', 'XL'], created_at=_timestamp(plan, rng),
+            ))
+    with transaction.atomic(), explicit_timestamps(School, Product):
+        School.objects.bulk_create(schools, batch_size=batch_size)
+        Product.objects.bulk_create(products, batch_size=batch_size)
+    return len(schools) + len(products)
+
+
+def seed_tailors(plan, start, stop, batch_size):
+    password = make_password(None)
+    users = [
+        User(id=plan['user_base'] + index, username=f"seed-tailor-{plan['user_base'] + index}",
+             email=f"tailor{plan['user_base'] + index}@seed.test", password=password)
+        for index in range(start, stop)
+    ]
+    profiles = [
+        TailorProfile(id=plan['tailor_base'] + index, user_id=plan['user_base'] + index, is_approved=True,
+                      is_email_verified=True, business_name=f'Seed Tailoring {index + 1}')
+        for index in range(start, stop)
+    ]
+    Link = TailorProfile.schools.through
+    links = [
+        Link(tailorprofile_id=plan['tailor_base'] + tailor_index, school_id=_school_id(plan, school_index))
+        for school_index in range(plan['schools'])
+        for tailor_index in _tailor_indexes(plan, school_index)
+        if start <= tailor_index < stop
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        TailorProfile.objects.bulk_create(profiles, batch_size=batch_size)
+        Link.objects.bulk_create(links, batch_size=batch_size)
+    return len(users) + len(profiles) + len(links)
+
+
+def seed_orders(plan, start, stop, batch_size):
+    permutation = CodePermutation(settings.ORDER_CODE_KEY)
+    statuses, weights = zip(*ORDER_STATUSES)
+    orders = []
+    lines = []
+    for index in range(start, stop):
+        rng = _rng(plan, 'orders', index)
+        school_index = rng.randrange(plan['schools'])
+        status = rng.choices(statuses, weights)[0]
+        created_at = _timestamp(plan, rng)
+        tailors = _tailor_indexes(plan, school_index)
+        tailor_id = plan['user_base'] + rng.choice(tailors) if tailors and status != 'pending' else None
+        order_id = plan['order_base'] + index
+        total = Decimal('0')
+        for garment_index in rng.sample(range(plan['products_per_school']), min(rng.randint(1, 4), plan['products_per_school'])):
+            quantity = rng.randint(1, 3)
+            price = _price(plan, school_index, garment_index)
+            total += price * quantity
+            lines.append(OrderLine(
+                order_id=order_id, product_id=_product_id(plan, school_index, garment_index),
+                quantity=quantity, price=price, **_student(rng),
+            ))
+        orders.append(Order(
+            id=order_id, order_code=encode(permutation.scramble(plan['order_code_base'] + index)),
+            school_id=_school_id(plan, school_index), customer_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}',
+            customer_phone=f'0{rng.randint(600000000, 849999999)}', customer_email=f'parent{order_id}@seed.test',
+            total_amount=total, status=status, tailor_id=tailor_id, created_at=created_at,
+            assigned_at=created_at if tailor_id else None,
+            deadline=created_at + timedelta(days=14) if tailor_id else None,
+        ))
+    with transaction.atomic(), explicit_timestamps(Order):
+        Order.objects.bulk_create(orders, batch_size=batch_size)
+        OrderLine.objects.bulk_create(lines, batch_size=batch_size)
+    return len(orders) + len(lines)
+
+
+def seed_carts(plan, start, stop, batch_size):
+    carts = []
+    items = []
+    for index in range(start, stop):
+        rng = _rng(plan, 'carts', index)
+        cart_id = plan['cart_base'] + index
+        school_index = rng.randrange(plan['schools'])
+        created_at = _timestamp(plan, rng)
+        carts.append(Cart(id=cart_id, session_key='%032x' % rng.getrandbits(128), created_at=created_at))
+        count = min(rng.randint(1, 2 * plan['items_per_cart'] - 1), plan['products_per_school'])
+        for garment_index in rng.sample(range(plan['products_per_school']), count):
+            items.append(CartItem(
+                cart_id=cart_id, product_id=_product_id(plan, school_index, garment_index),
+                quantity=rng.randint(1, 3), measurements=_measurements(rng), created_at=created_at, **_student(rng),
+            ))
+    with transaction.atomic(), explicit_timestamps(Cart, CartItem):
+        Cart.objects.bulk_create(carts, batch_size=batch_size)
+        CartItem.objects.bulk_create(items, batch_size=batch_size)
+    return len(carts) + len(items)
@@ -1,9 +1,53 @@
 from rest_framework import serializers
-from .models import School, Product, Order, OrderLine, TailorProfile, DeliveryPartnerProfile, Shipment, Payment, Cart, CartItem
+from rest_framework.relations import MANY_RELATION_KWARGS
+from .models import School, Product, Order, OrderLine, TailorProfile, DeliveryPartnerProfile, Shipment, Payment, Cart, CartItem, ImageUpload
+from datetime import timedelta
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from .images import FORMATS, srcset
+from .uploads import CHUNKED_UPLOAD_MAX_CHUNK, CHUNKED_UPLOAD_MAX_SIZE, IMAGE_EXTENSIONS
 import random
 import string
 
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """ManyRelatedField that looks all submitted primary keys up in one query, not one each"""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+        keys = []
+        for value in data:
+            if isinstance(value, bool):
+                child.fail('incorrect_type', data_type=type(value).__name__)
+            try:
+                keys.append(pk_field.to_python(value))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(value).__name__)
+        
+        found = child.get_queryset().in_bulk(keys)
+        for value, key in zip(data, keys):
+            if key not in found:
+                child.fail('does_not_exist', pk_value=value)
+        return [found[key] for key in keys]
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField whose many=True form validates in a single query"""
+    
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -17,11 +61,54 @@ class SchoolSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     school_name = serializers.CharField(source='school.name', read_only=True)
     garment_type_display = serializers.CharField(source='get_garment_type_display', read_only=True)
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
-        fields = ('id', 'school', 'school_name', 'description', 'image', 'price', 
+        fields = ('id', 'school', 'school_name', 'description', 'image', 'srcset', 'price', 
                  'garment_type', 'garment_type_display', 'available_sizes', 'created_at')
+    
+    def get_srcset(self, obj):
+        """Resized WebP and JPEG copies of the image, or None until they have been built"""
+        if not obj.image or obj.image_derivatives_source != obj.image.name:
+            return None
+        request = self.context.get('request')
+        
+        def build_url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+        
+        return {
+            image_format: srcset(obj.image_derivatives, image_format, build_url)
+            for image_format in FORMATS
+        }
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'product', 'filename', 'size', 'sha256', 'offset', 'status', 'chunk_size', 'created_at')
+        read_only_fields = ('id', 'product', 'offset', 'status', 'created_at')
+    
+    def get_chunk_size(self, obj):
+        return CHUNKED_UPLOAD_MAX_CHUNK
+    
+    def validate_filename(self, value):
+        if not value.lower().endswith(IMAGE_EXTENSIONS):
+            raise serializers.ValidationError(f"Only {', '.join(IMAGE_EXTENSIONS)} images can be uploaded.")
+        return value
+    
+    def validate_size(self, value):
+        if not 0 < value <= CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {CHUNKED_UPLOAD_MAX_SIZE} bytes.")
+        return value
+    
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(char not in '0123456789abcdef' for char in value):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value
 
 class OrderLineSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.school.name', read_only=True)
@@ -46,7 +133,8 @@ class OrderLineCreateSerializer(serializers.ModelSerializer):
         fields = ('product', 'quantity', 'price', 'student_name', 'student_age', 'student_grade', 'student_gender', 'student_height')
 
 class OrderCreateSerializer(serializers.ModelSerializer):
-    lines = OrderLineCreateSerializer(many=True)
+    # Guest checkout builds the lines from the session cart instead
+    lines = OrderLineCreateSerializer(many=True, required=False)
     
     class Meta:
         model = Order
@@ -54,14 +142,32 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ('order_code', 'status', 'tailor', 'delivery_partner', 'created_at', 'updated_at')
     
     def create(self, validated_data):
-        lines_data = validated_data.pop('lines')
+        lines_data = validated_data.pop('lines', [])
         order = Order.objects.create(**validated_data)
         
-        for line_data in lines_data:
-            OrderLine.objects.create(order=order, **line_data)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, **line_data) for line_data in lines_data
+        ])
         
         return order
 
+MEASUREMENT_FIELDS = (
+    'bust_chest', 'waist', 'hips', 'shoulder_width', 'sleeve_length',
+    'front_length', 'back_length', 'inseam', 'outseam', 'thigh', 'knee',
+    'neck', 'shirt_length', 'skirt_length', 'dress_length'
+)
+
+def pop_measurements(validated_data):
+    """Remove the flat measurement fields from validated_data and return them as a dict"""
+    measurements = {}
+    for field in MEASUREMENT_FIELDS:
+        if field in validated_data:
+            # Convert to float for JSON serialization
+            value = validated_data.pop(field)
+            if value is not None:
+                measurements[field] = float(value)
+    return measurements
+
 class CartItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.school.name', read_only=True)
     garment_type = serializers.CharField(source='product.garment_type', read_only=True)
@@ -95,43 +201,14 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         # Extract measurement fields from validated_data
-        measurement_fields = [
-            'bust_chest', 'waist', 'hips', 'shoulder_width', 'sleeve_length',
-            'front_length', 'back_length', 'inseam', 'outseam', 'thigh', 'knee',
-            'neck', 'shirt_length', 'skirt_length', 'dress_length'
-        ]
-        
-        measurements = {}
-        for field in measurement_fields:
-            if field in validated_data:
-                # Convert to float for JSON serialization
-                value = validated_data.pop(field)
-                if value is not None:
-                    measurements[field] = float(value)
+        measurements = pop_measurements(validated_data)
         
         # Create the cart item with measurements
-        cart_item = CartItem.objects.create(**validated_data)
-        if measurements:
-            cart_item.measurements = measurements
-            cart_item.save()
-        
-        return cart_item
+        return CartItem.objects.create(measurements=measurements or None, **validated_data)
     
     def update(self, instance, validated_data):
         # Extract measurement fields from validated_data
-        measurement_fields = [
-            'bust_chest', 'waist', 'hips', 'shoulder_width', 'sleeve_length',
-            'front_length', 'back_length', 'inseam', 'outseam', 'thigh', 'knee',
-            'neck', 'shirt_length', 'skirt_length', 'dress_length'
-        ]
-        
-        measurements = {}
-        for field in measurement_fields:
-            if field in validated_data:
-                # Convert to float for JSON serialization
-                value = validated_data.pop(field)
-                if value is not None:
-                    measurements[field] = float(value)
+        measurements = pop_measurements(validated_data)
         
         # Update the cart item
         for attr, value in validated_data.items():
@@ -147,6 +224,38 @@ class CartItemSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+class BulkCartLineSerializer(serializers.Serializer):
+    """One line of a bulk add, products are resolved together by BulkAddToCartSerializer"""
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    student_name = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    student_age = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    student_grade = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    student_gender = serializers.ChoiceField(choices=('male', 'female', 'other'), required=False, allow_null=True)
+    student_height = serializers.DecimalField(max_digits=5, decimal_places=1, required=False, allow_null=True)
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in MEASUREMENT_FIELDS:
+            fields[name] = serializers.FloatField(required=False, allow_null=True)
+        return fields
+
+class BulkAddToCartSerializer(serializers.Serializer):
+    items = BulkCartLineSerializer(many=True, allow_empty=False, max_length=100)
+    
+    def validate_items(self, items):
+        # One query for every product in the batch
+        product_ids = {item['product'] for item in items}
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(f"Unknown product ids: {', '.join(map(str, missing))}.")
+        
+        for item in items:
+            item['product'] = products[item['product']]
+            item['measurements'] = pop_measurements(item)
+        return items
+
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
@@ -177,6 +286,19 @@ class ShipmentSerializer(serializers.ModelSerializer):
         model = Shipment
         fields = '__all__'
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    school_name = serializers.CharField(source='school.name', read_only=True)
+    school_address = serializers.CharField(source='school.address', read_only=True)
+    school_town = serializers.CharField(source='school.town', read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ('id', 'order_code', 'status', 'customer_name', 'customer_phone', 'student_name',
+                 'student_grade', 'school', 'school_name', 'school_address', 'school_town', 'deadline')
+
+class ShipmentFeedSerializer(ShipmentSerializer):
+    order_summary = OrderSummarySerializer(source='order', read_only=True)
+
 class PaymentSerializer(serializers.ModelSerializer):
     order_code = serializers.CharField(source='order.order_code', read_only=True)
     
@@ -206,7 +328,7 @@ class TailorRegistrationSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(write_only=True)
     last_name = serializers.CharField(write_only=True)
     password = serializers.CharField(write_only=True)
-    schools = serializers.PrimaryKeyRelatedField(
+    schools = BulkPrimaryKeyRelatedField(
         queryset=School.objects.all(), 
         many=True,
         required=True
@@ -251,7 +373,7 @@ class TailorRegistrationSerializer(serializers.ModelSerializer):
         verification_code = tailor_profile.generate_verification_code()
         
         # Send email with verification code
-        from django.core.mail import send_mail
+        from .mailqueue import queue_mail
         from django.conf import settings
         
         subject = 'Email Verification for Tailor Account'
@@ -267,12 +389,11 @@ class TailorRegistrationSerializer(serializers.ModelSerializer):
         The School Uniforms Team
         '''
         
-        send_mail(
+        queue_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
+            [email]
         )
         
         return tailor_profile
@@ -285,7 +406,7 @@ class DeliveryPartnerRegistrationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = DeliveryPartnerProfile
-        exclude = ('user', 'is_approved', 'created_at', 'is_email_verified', 'email_verification')
+        exclude = ('user', 'is_approved', 'created_at', 'is_email_verified', 'email_verification_code')
     
     def create(self, validated_data):
         # Extract user data
@@ -313,7 +434,7 @@ class DeliveryPartnerRegistrationSerializer(serializers.ModelSerializer):
         verification_code = delivery_profile.generate_verification_code()
         
         # Send email with verification code
-        from django.core.mail import send_mail
+        from .mailqueue import queue_mail
         from django.conf import settings
         
         subject = 'Email Verification for Delivery Partner Account'
@@ -329,12 +450,36 @@ class DeliveryPartnerRegistrationSerializer(serializers.ModelSerializer):
         The School Uniforms Team
         '''
         
-        send_mail(
+        queue_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
+            [email]
         )
         
-        return delivery_profile
\ No newline at end of file
+        return delivery_profile
+
+SALES_REPORT_GROUPS = ('day', 'school', 'garment_type', 'status')
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """Query parameters of the sales report, defaults to the last 30 days"""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    school = serializers.IntegerField(required=False, min_value=1)
+    garment_type = serializers.ChoiceField(choices=Product.GARMENT_TYPES, required=False)
+    status = serializers.ChoiceField(choices=Order.ORDER_STATUS, required=False)
+    group_by = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_group_by(self, value):
+        groups = [group.strip() for group in value.split(',') if group.strip()]
+        unknown = [group for group in groups if group not in SALES_REPORT_GROUPS]
+        if unknown:
+            raise serializers.ValidationError(f"Can only group by {', '.join(SALES_REPORT_GROUPS)}.")
+        return list(dict.fromkeys(groups))
+    
+    def validate(self, data):
+        data.setdefault('date_to', timezone.localdate())
+        data.setdefault('date_from', data['date_to'] - timedelta(days=29))
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return data
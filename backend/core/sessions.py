@@ -0,0 +1,52 @@
+"""
+Low-write session engine.
+
+Sessions are read from the shared cache and written through to the database
+only when their data changes. Instead of saving on every request to slide the
+expiry (SESSION_SAVE_EVERY_REQUEST), the expiry is refreshed once the session
+has used up half of SESSION_COOKIE_AGE, so a browsing visitor costs at most
+one session write per half cookie age. SessionRefreshMiddleware makes sure
+that check also runs on requests whose view never reads the session.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'core.sessions'
+
+    def load(self):
+        data = super().load()
+        refreshed_at = data.get(REFRESHED_AT_KEY)
+        if data and (refreshed_at is None or time.time() - refreshed_at > settings.SESSION_COOKIE_AGE / 2):
+            # Let SessionMiddleware save it and re-issue the cookie
+            self.modified = True
+        return data
+
+    def save(self, must_create=False):
+        if self._session:
+            self._session[REFRESHED_AT_KEY] = int(time.time())
+        super().save(must_create)
+
+
+class SessionRefreshMiddleware:
+    """
+    Load the session (from the cache) on responses to requests that carry a
+    session cookie, so an expiring session gets refreshed even by views that
+    never touch it. Must sit after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        if isinstance(session, SessionStore) and not session.accessed and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            # load() flags a stale session as modified without marking it accessed
+            session.load()
+        return response
@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .assignment import invalidate_tailor_index
+from .catalogcache import SCHOOLS_SCOPE, bump_version, school_scope
+from .images import schedule_derivatives
+from .models import Order, OrderLine, Product, School, TailorProfile
+from .reporting import counted_order, order_contributions, record_status_change, replace_contributions
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_school_catalog(sender, instance, **kwargs):
+    bump_version(SCHOOLS_SCOPE)
+    bump_version(school_scope(instance.pk))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_school(sender, instance, **kwargs):
+    # A product moved to another school must also drop out of the old school's listing
+    if instance.pk:
+        instance._previous_school_id = (
+            Product.objects.filter(pk=instance.pk).values_list('school_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_catalog(sender, instance, **kwargs):
+    bump_version(school_scope(instance.school_id))
+    previous_school_id = getattr(instance, '_previous_school_id', None)
+    if previous_school_id and previous_school_id != instance.school_id:
+        bump_version(school_scope(previous_school_id))
+
+
+@receiver(post_save, sender=Product)
+def build_product_image_derivatives(sender, instance, **kwargs):
+    if not getattr(settings, 'PRODUCT_IMAGE_DERIVATIVES_ON_UPLOAD', True):
+        return
+    if instance.image and instance.image.name != instance.image_derivatives_source:
+        product_id = instance.pk
+        transaction.on_commit(lambda: schedule_derivatives(product_id))
+
+
+@receiver(post_save, sender=TailorProfile)
+@receiver(post_delete, sender=TailorProfile)
+def tailor_profile_changed(sender, **kwargs):
+    invalidate_tailor_index()
+
+
+@receiver(m2m_changed, sender=TailorProfile.schools.through)
+def tailor_schools_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_tailor_index()
+
+
+def _loaded_tailor(order):
+    """The tailor user id an order currently counts against, if any"""
+    if order.tailor_id and order.status in Order.OPEN_STATUSES:
+        return order.tailor_id
+    return None
+
+
+def _adjust_open_orders(user_id, delta):
+    queryset = TailorProfile.objects.filter(user_id=user_id)
+    if delta < 0:
+        queryset = queryset.filter(open_orders__gt=0)
+    queryset.update(open_orders=F('open_orders') + delta)
+
+
+# Stands in for the loaded tailor and status of an order fetched with them deferred
+_DEFERRED = object()
+
+
+@receiver(post_init, sender=Order)
+def remember_order_load(sender, instance, **kwargs):
+    if 'status' not in instance.__dict__ or 'tailor_id' not in instance.__dict__:
+        # Deferred by .only()/.defer(); reading them here would cost a query per row,
+        # they are fetched on pre_save/pre_delete instead, for the rows that get there
+        instance._loaded_tailor = instance._loaded_status = _DEFERRED
+        return
+    instance._loaded_tailor = _loaded_tailor(instance)
+    instance._loaded_status = instance.status if instance.pk else None
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_delete, sender=Order)
+def load_deferred_order_state(sender, instance, **kwargs):
+    if instance._loaded_status is not _DEFERRED:
+        return
+    row = Order.objects.filter(pk=instance.pk).values('status', 'tailor_id').first() or {}
+    status, tailor_id = row.get('status'), row.get('tailor_id')
+    instance._loaded_tailor = tailor_id if tailor_id and status in Order.OPEN_STATUSES else None
+    instance._loaded_status = status
+
+
+@receiver(post_save, sender=Order)
+def update_tailor_load(sender, instance, **kwargs):
+    previous, current = instance._loaded_tailor, _loaded_tailor(instance)
+    if previous != current:
+        if previous:
+            _adjust_open_orders(previous, -1)
+        if current:
+            _adjust_open_orders(current, 1)
+        instance._loaded_tailor = current
+
+
+@receiver(post_delete, sender=Order)
+def release_tailor_load(sender, instance, **kwargs):
+    if instance._loaded_tailor:
+        _adjust_open_orders(instance._loaded_tailor, -1)
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, **kwargs):
+    # A new order starts from no status, so one created already paid is counted straight away
+    if instance._loaded_status != instance.status:
+        record_status_change(instance, instance._loaded_status, instance.status)
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    # Before the cascade, while the order's lines can still be summed
+    if instance._loaded_status:
+        record_status_change(instance, instance._loaded_status, None)
+
+
+def _remember_line_contributions(instance, order_ids):
+    instance._rollup_contributions = [
+        (order, order_contributions(order.pk))
+        for order in filter(None, map(counted_order, set(order_ids) - {None}))
+    ]
+
+
+@receiver(pre_save, sender=OrderLine)
+def remember_line_orders(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    order_ids = [instance.order_id]
+    if instance.pk:
+        # The line may be moving over from another order
+        order_ids += OrderLine.objects.filter(pk=instance.pk).values_list('order_id', flat=True)
+    _remember_line_contributions(instance, order_ids)
+
+
+@receiver(pre_delete, sender=OrderLine)
+def remember_deleted_line_order(sender, instance, origin=None, **kwargs):
+    # Deleting the order itself takes all of its sales out in remove_from_sales_rollups
+    deleting_orders = isinstance(origin, Order) or getattr(origin, 'model', None) is Order
+    _remember_line_contributions(instance, [] if deleting_orders else [instance.order_id])
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def update_line_sales_rollups(sender, instance, **kwargs):
+    # Lines edited after payment, e.g. in the admin, change what the order sold
+    for order, before in getattr(instance, '_rollup_contributions', ()):
+        replace_contributions(order, before, order_contributions(order.pk))
+    instance._rollup_contributions = []
@@ -1,21 +1,58 @@
 # core/tailorviews.py
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .models import Order, TailorProfile
+from .pagination import KeysetPagination
+from .queryplans import PlannedQuerysetMixin, plan_queryset
 from .serializers import OrderSerializer
 
+def _parse_deadline(value):
+    """Parse an ISO date or datetime query parameter into an aware datetime"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
 class TailorOrderListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         try:
             tailor_profile = TailorProfile.objects.get(user=self.request.user)
-            return Order.objects.filter(school__in=tailor_profile.schools.all())
         except TailorProfile.DoesNotExist:
             return Order.objects.none()
+        
+        queryset = Order.objects.filter(school__in=tailor_profile.schools.all())
+        
+        # Optional filters: ?status=confirmed,in_production&deadline_before=...&deadline_after=...
+        statuses = self.request.query_params.get('status')
+        if statuses:
+            queryset = queryset.filter(status__in=statuses.split(','))
+        
+        deadline_before = self.request.query_params.get('deadline_before')
+        deadline_after = self.request.query_params.get('deadline_after')
+        try:
+            if deadline_before:
+                queryset = queryset.filter(deadline__lte=_parse_deadline(deadline_before))
+            if deadline_after:
+                queryset = queryset.filter(deadline__gte=_parse_deadline(deadline_after))
+        except ValueError:
+            raise ValidationError({"error": "Deadline filters must be ISO 8601 dates or datetimes."})
+        
+        return plan_queryset(queryset, self.get_serializer_class())
 
-class TailorOrderUpdateView(generics.UpdateAPIView):
+class TailorOrderUpdateView(PlannedQuerysetMixin, generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -28,7 +65,7 @@ class TailorOrderUpdateView(generics.UpdateAPIView):
             tailor_profile = TailorProfile.objects.get(user=self.request.user)
             
             # Check if the tailor is assigned to this school
-            if instance.school not in tailor_profile.schools.all():
+            if not tailor_profile.schools.filter(pk=instance.school_id).exists():
                 return Response(
                     {"error": "You are not assigned to this school."},
                     status=status.HTTP_403_FORBIDDEN
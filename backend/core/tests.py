@@ -1,3 +1,1740 @@
-from django.test import TestCase
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F, Max, Q, QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .mailqueue import deliver_batch, queue_mail
+from .models import (
+    School, Product, Cart, CartItem, Order, OrderLine, TailorProfile, OutboundEmail,
+    Payment, PaymentEvent, DeliveryPartnerProfile, Shipment, OrderConfirmationToken, ImageUpload,
+    SalesRollup
+)
+from .assignment import assign_order
+from .orderviews import TailorOrderConfirmationView
+from .images import pending_products
+from . import metrics, urls
+from .codes import (
+    CodePermutation, OrderCodeAllocator, decode, encode, is_valid_code, order_code_allocator, token_digest
+)
+from .paymentevents import process_pending_events
+from .paymentgateway import CircuitBreaker, CircuitOpenError, PaymentGatewayError, PayPalGateway, get_gateway
+from .queryplans import build_plan
+from .sessions import REFRESHED_AT_KEY, SessionStore
+from .serializers import OrderSerializer
+from .uploads import append_chunk
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(school=self.school, garment_type='blazer', price=Decimal('45.00'))
+
+    def test_school_list_served_from_cache(self):
+        url = reverse('schools-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'Greenwood High')
+
+    def test_image_urls_are_cached_per_scheme(self):
+        Product.objects.filter(pk=self.product.pk).update(image='products/blazer.jpg')
+        url = reverse('school-products', kwargs={'school_id': self.school.id})
+        self.client.get(url)
+        response = self.client.get(url, secure=True)
+        self.assertTrue(response.data[0]['image'].startswith('https://'), response.data[0]['image'])
+        self.assertTrue(self.client.get(url).data[0]['image'].startswith('http://'))
+
+    def test_if_none_match_returns_not_modified(self):
+        url = reverse('school-products', kwargs={'school_id': self.school.id})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_product_change_invalidates_school_products(self):
+        url = reverse('school-products', kwargs={'school_id': self.school.id})
+        etag = self.client.get(url)['ETag']
+
+        self.product.price = Decimal('50.00')
+        self.product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['price'], '50.00')
+
+    def test_school_delete_invalidates_list_and_detail(self):
+        detail_url = reverse('school-detail', kwargs={'pk': self.school.id})
+        self.client.get(reverse('schools-list'))
+        self.client.get(detail_url)
+
+        self.school.delete()
+
+        self.assertEqual(self.client.get(reverse('schools-list')).data, [])
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+
+class OrderQueryPlanTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.products = [
+            Product.objects.create(school=self.school, garment_type=garment_type, price=Decimal('20.00'))
+            for garment_type in ('shirt_blouse', 'trousers_pants', 'blazer', 'accessory')
+        ]
+        user = User.objects.create_user(username='tailor@example.com', password='secret')
+        profile = TailorProfile.objects.create(user=user, is_approved=True, is_email_verified=True)
+        profile.schools.add(self.school)
+        self.tailor = user
+
+    def create_order(self, code, line_count):
+        order = Order.objects.create(order_code=code, school=self.school, tailor=self.tailor)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=self.products[i % len(self.products)], quantity=1, price=Decimal('20.00'))
+            for i in range(line_count)
+        ])
+        return order
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_plan_is_derived_from_serializer_sources(self):
+        select_related, prefetch_related = build_plan(OrderSerializer)
+        self.assertEqual(select_related, [])
+        self.assertEqual([prefetch.prefetch_to for prefetch in prefetch_related], ['lines'])
+        self.assertEqual(prefetch_related[0].queryset.query.select_related, {'product': {'school': {}}})
+
+    def test_order_lookup_query_count_is_constant(self):
+        self.create_order('SMALL001', 1)
+        self.create_order('LARGE001', 200)
+        small = self.count_queries(reverse('order-lookup', kwargs={'order_code': 'SMALL001'}))
+        large = self.count_queries(reverse('order-lookup', kwargs={'order_code': 'LARGE001'}))
+        self.assertEqual(small, large)
+
+    def test_tailor_order_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.tailor)
+        self.create_order('SMALL001', 1)
+        small = self.count_queries(reverse('tailor-orders'))
+        for i in range(5):
+            self.create_order(f'LARGE00{i}', 200)
+        large = self.count_queries(reverse('tailor-orders'))
+        self.assertEqual(small, large)
+
+
+@override_settings(PAYMENT_GATEWAY='core.paymentgateway.FakeGateway')
+class GuestCheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(school=self.school, garment_type='blazer', price=Decimal('45.00'))
+        session = self.client.session
+        session.save()
+        self.cart = Cart.objects.create(session_key=session.session_key)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=self.product, quantity=2, student_name=f'Student {i}')
+            for i in range(count)
+        ])
+
+    def checkout(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('guest-checkout'), {
+                'customer_name': 'Thandi', 'customer_email': 'thandi@example.com', 'school': self.school.id,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(queries)
+
+    def test_cart_is_converted_to_order_lines(self):
+        self.fill_cart(3)
+        response, _ = self.checkout()
+        order = Order.objects.get(order_code=response.data['order_code'])
+        self.assertEqual(order.total_amount, Decimal('270.00'))
+        self.assertEqual(order.lines.count(), 3)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+        self.assertFalse(CartItem.objects.exists())
+        # Stored up front, so a webhook that arrives before the customer is back can apply
+        payment = Payment.objects.get(order=order)
+        self.assertEqual((payment.transaction_id, payment.status), (response.data['payment_id'], 'pending'))
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        self.fill_cart(1)
+        _, small = self.checkout()
+        session = self.client.session
+        self.cart = Cart.objects.create(session_key=session.session_key)
+        self.fill_cart(30)
+        _, large = self.checkout()
+        self.assertEqual(small, large)
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.shirt = Product.objects.create(school=school, garment_type='shirt_blouse', price=Decimal('12.50'))
+        self.tie = Product.objects.create(school=school, garment_type='accessory')
+        session = self.client.session
+        session.save()
+        self.cart = Cart.objects.create(session_key=session.session_key)
+
+    def get_cart(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_totals_are_annotated(self):
+        CartItem.objects.create(cart=self.cart, product=self.shirt, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.tie, quantity=1)
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        self.assertEqual(cart.items_total, Decimal('37.50'))
+        self.assertEqual(self.cart.get_total(), Decimal('37.50'))
+
+        response, _ = self.get_cart()
+        self.assertEqual(Decimal(str(response.data['total'])), Decimal('37.50'))
+        totals = sorted(Decimal(str(item['total'])) for item in response.data['items'])
+        self.assertEqual(totals, [Decimal('0'), Decimal('37.50')])
+
+    def test_cart_render_query_count_is_constant(self):
+        CartItem.objects.create(cart=self.cart, product=self.shirt, quantity=1)
+        _, small = self.get_cart()
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=self.shirt, quantity=1, student_name=f'Student {i}')
+            for i in range(20)
+        ])
+        _, large = self.get_cart()
+        self.assertEqual(small, large)
+
+
+class MailQueueTests(TestCase):
+    def test_queue_mail_does_not_send_inline(self):
+        queue_mail('Hello', 'Body', 'shop@example.com', ['parent@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().status, 'pending')
+
+    def test_worker_drains_outbox(self):
+        for i in range(3):
+            queue_mail(f'Order {i}', 'Body', 'shop@example.com', ['parent@example.com'])
+        call_command('send_queued_mail', batch_size=2, stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = queue_mail('Hello', 'Body', 'shop@example.com', ['parent@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('relay down')):
+            self.assertEqual(deliver_batch(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('relay down', email.last_error)
+        # Not due yet, so the next run leaves it alone
+        self.assertEqual(deliver_batch(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=email.created_at)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('relay down')):
+            deliver_batch(max_attempts=2)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+
+    def test_rows_claimed_by_another_worker_are_not_sent(self):
+        first = queue_mail('First', 'Body', 'shop@example.com', ['parent@example.com'])
+        second = queue_mail('Second', 'Body', 'shop@example.com', ['parent@example.com'])
+        real_values_list = QuerySet.values_list
+
+        def values_list(queryset, *fields, **kwargs):
+            # Another worker claims the first row between our SELECT and our UPDATE
+            ids = real_values_list(queryset, *fields, **kwargs)
+            OutboundEmail.objects.filter(pk=first.pk).update(
+                status='sending', next_attempt_at=timezone.now() + timedelta(minutes=5)
+            )
+            return ids
+
+        with mock.patch.object(QuerySet, 'values_list', values_list):
+            self.assertEqual(deliver_batch(), (1, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ['Second'])
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'sending')
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.claim_token), ('sent', None))
+
+    def test_expired_claim_is_picked_up_again(self):
+        email = queue_mail('Hello', 'Body', 'shop@example.com', ['parent@example.com'])
+        OutboundEmail.objects.update(status='sending', next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(deliver_batch(), (0, 0))
+
+        # The worker holding it died, so it is sent once the lease runs out
+        OutboundEmail.objects.update(next_attempt_at=email.created_at)
+        self.assertEqual(deliver_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class PayPalGatewayTests(TestCase):
+    def setUp(self):
+        self.gateway = PayPalGateway(mode='sandbox', client_id='id', client_secret='secret',
+                                     failure_threshold=2, reset_timeout=60)
+
+    def respond(self, status_code, data):
+        response = mock.Mock(status_code=status_code)
+        response.json.return_value = data
+        return response
+
+    def test_access_token_is_reused_until_expiry(self):
+        token = self.respond(200, {'access_token': 'abc', 'expires_in': 3600})
+        payment = self.respond(201, {'id': 'PAY-1'})
+        with mock.patch.object(self.gateway.session, 'request', side_effect=[token, payment, payment]) as request:
+            self.gateway.create_payment({})
+            self.gateway.find_payment('PAY-1')
+        paths = [call.args[1] for call in request.call_args_list]
+        self.assertEqual(paths.count('https://api.sandbox.paypal.com/v1/oauth2/token'), 1)
+        self.assertTrue(all(call.kwargs['timeout'] for call in request.call_args_list))
+
+    def test_circuit_opens_after_repeated_failures(self):
+        with mock.patch.object(self.gateway.session, 'request', side_effect=requests.Timeout('slow')) as request:
+            for _ in range(2):
+                with self.assertRaises(PaymentGatewayError):
+                    self.gateway.find_payment('PAY-1')
+            with self.assertRaises(CircuitOpenError):
+                self.gateway.find_payment('PAY-1')
+        self.assertEqual(request.call_count, 2)
+
+    def test_half_open_circuit_lets_a_single_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with mock.patch('core.paymentgateway.time.monotonic', return_value=100):
+            breaker.record_failure()
+        with mock.patch('core.paymentgateway.time.monotonic', return_value=200):
+            breaker.before_call()
+            # Everyone else fails fast while the trial is out
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+            breaker.record_failure()
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+        with mock.patch('core.paymentgateway.time.monotonic', return_value=300):
+            breaker.before_call()
+            breaker.record_success()
+            breaker.before_call()
+            breaker.before_call()
+
+
+@override_settings(PAYMENT_GATEWAY='core.paymentgateway.FakeGateway')
+class PaymentWebhookTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.order = Order.objects.create(order_code='WEBHOOK1', school=school, total_amount=Decimal('90.00'),
+                                          customer_email='thandi@example.com')
+        self.payment = Payment.objects.create(order=self.order, amount=Decimal('90.00'), transaction_id='PAY-1')
+        user = User.objects.create_user(username='tailor@example.com', email='tailor@example.com', password='secret')
+        TailorProfile.objects.create(user=user, is_approved=True, is_email_verified=True).schools.add(school)
+        cache.clear()
+
+    def deliver(self, event_id, event_type, create_time):
+        return self.client.post(reverse('payment-webhook'), {
+            'id': event_id,
+            'event_type': event_type,
+            'create_time': create_time,
+            'resource': {'id': f'SALE-{event_id}', 'parent_payment': 'PAY-1'},
+        }, format='json', HTTP_PAYPAL_TRANSMISSION_ID='t-1')
+
+    def test_webhook_only_stores_event(self):
+        response = self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        self.assertEqual(response.status_code, 200)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertEqual(PaymentEvent.objects.get().status, 'pending')
+
+    def test_replayed_event_is_stored_once(self):
+        self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        process_pending_events()
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.order.status, 'confirmed')
+
+    def test_webhook_confirmation_assigns_and_notifies_once(self):
+        self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        process_pending_events()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.tailor.username, 'tailor@example.com')
+        self.assertTrue(OrderConfirmationToken.objects.filter(order=self.order).exists())
+        recipients = sorted(email.recipients[0] for email in OutboundEmail.objects.all())
+        self.assertEqual(recipients, ['tailor@example.com', 'thandi@example.com'])
+
+        # The customer coming back from PayPal afterwards changes nothing
+        self.client.force_authenticate(User.objects.create_user(username='thandi', password='secret'))
+        with mock.patch('core.paymentgateway.FakeGateway.execute_payment'):
+            response = self.client.post(reverse('payment-execute'), {'paymentID': 'PAY-1', 'payerID': 'PAYER'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+        self.assertEqual(TailorProfile.objects.get().open_orders, 1)
+
+    def test_late_event_does_not_undo_newer_state(self):
+        self.deliver('WH-2', 'PAYMENT.SALE.REFUNDED', '2025-09-02T10:00:00Z')
+        process_pending_events()
+        self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        process_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(PaymentEvent.objects.get(event_id='WH-1').status, 'ignored')
+
+    def test_failing_event_is_retried_with_backoff(self):
+        self.payment.delete()
+        self.deliver('WH-1', 'PAYMENT.SALE.COMPLETED', '2025-09-01T10:00:00Z')
+        self.assertEqual(process_pending_events(), 0)
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        # Not due yet, so the next run leaves it alone
+        process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+
+        Payment.objects.create(order=self.order, amount=Decimal('90.00'), transaction_id='PAY-1')
+        PaymentEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_pending_events(), 1)
+        self.assertEqual(PaymentEvent.objects.get().status, 'processed')
+
+    def test_unverified_webhook_is_rejected(self):
+        response = self.client.post(reverse('payment-webhook'), {'id': 'WH-9', 'event_type': 'PAYMENT.SALE.COMPLETED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+
+class TailorAssignmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.tailors = []
+        for name in ('first', 'second'):
+            user = User.objects.create_user(username=f'{name}@example.com', password='secret')
+            profile = TailorProfile.objects.create(user=user, is_approved=True, is_email_verified=True)
+            profile.schools.add(self.school)
+            self.tailors.append(profile)
+
+    def new_order(self, code):
+        return Order.objects.create(order_code=code, school=self.school, status='confirmed')
+
+    def test_orders_are_spread_over_least_loaded_tailors(self):
+        assigned = [assign_order(self.new_order(f'ORDER00{i}'))[0].pk for i in range(4)]
+        self.assertEqual(sorted(assigned), sorted([tailor.pk for tailor in self.tailors] * 2))
+        for tailor in self.tailors:
+            tailor.refresh_from_db()
+            self.assertEqual(tailor.open_orders, 2)
+
+    def test_assignment_writes_order_once(self):
+        order = self.new_order('ORDER001')
+        _, token = assign_order(order)
+        with CaptureQueriesContext(connection) as queries:
+            assign_order(self.new_order('ORDER002'))
+        order_updates = [q for q in queries if q['sql'].startswith('UPDATE "core_order"')]
+        self.assertEqual(len(order_updates), 1)
+        self.assertEqual(OrderConfirmationToken.objects.resolve(token).get().order, order)
+        self.assertIsNotNone(order.deadline)
+
+    def test_closing_an_order_releases_load(self):
+        order = self.new_order('ORDER001')
+        tailor, _ = assign_order(order)
+        order.status = 'completed'
+        order.save()
+        tailor.refresh_from_db()
+        self.assertEqual(tailor.open_orders, 0)
+
+    def test_deferred_loads_do_not_query_per_row(self):
+        orders = [self.new_order(f'ORDER00{i}') for i in range(3)]
+        tailor, _ = assign_order(orders[0])
+        with self.assertNumQueries(1):
+            deferred = list(Order.objects.only('order_code').order_by('pk'))
+        # Saving one still moves the tailor's load, its old state is fetched then
+        deferred[0].status = 'completed'
+        deferred[0].save()
+        tailor.refresh_from_db()
+        self.assertEqual(tailor.open_orders, 0)
+        Order.objects.defer('status', 'tailor').get(pk=orders[1].pk).delete()
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_unapproved_tailor_drops_out_of_index(self):
+        assign_order(self.new_order('ORDER001'))
+        first = self.tailors[0]
+        first.is_approved = False
+        first.save()
+        for i in range(3):
+            self.assertEqual(assign_order(self.new_order(f'ORDER10{i}'))[0].pk, self.tailors[1].pk)
+
+    def test_stale_index_is_only_a_hint(self):
+        assign_order(self.new_order('ORDER001'))
+        # Bypasses the signals, so the cached index still lists the first tailor
+        TailorProfile.objects.filter(pk=self.tailors[0].pk).update(is_approved=False)
+        for i in range(2):
+            self.assertEqual(assign_order(self.new_order(f'ORDER10{i}'))[0].pk, self.tailors[1].pk)
+        TailorProfile.objects.filter(pk__in=[tailor.pk for tailor in self.tailors]).update(is_email_verified=False)
+        self.assertEqual(assign_order(self.new_order('ORDER002')), (None, None))
+
+    def test_assignment_skips_the_school_join_once_cached(self):
+        assign_order(self.new_order('ORDER001'))
+        with CaptureQueriesContext(connection) as queries:
+            assign_order(self.new_order('ORDER002'))
+        self.assertFalse([q for q in queries if 'core_tailorprofile_schools' in q['sql']])
+
+
+class TailorOrderFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        user = User.objects.create_user(username='tailor@example.com', password='secret')
+        TailorProfile.objects.create(user=user, is_approved=True, is_email_verified=True).schools.add(school)
+        self.client.force_authenticate(user)
+        Order.objects.bulk_create([
+            Order(order_code=f'FEED{i:04d}', school=school, status='confirmed' if i % 2 else 'pending')
+            for i in range(30)
+        ])
+
+    def test_feed_is_cursor_paginated(self):
+        url = reverse('tailor-orders')
+        seen = []
+        while url:
+            response = self.client.get(url, {'page_size': 8} if not seen else None)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order['order_code'] for order in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+    def test_status_filter(self):
+        response = self.client.get(reverse('tailor-orders'), {'status': 'confirmed', 'page_size': 100})
+        self.assertEqual(len(response.data['results']), 15)
+        self.assertTrue(all(order['status'] == 'confirmed' for order in response.data['results']))
+
+    def test_invalid_deadline_filter(self):
+        response = self.client.get(reverse('tailor-orders'), {'deadline_before': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DeliveryShipmentFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.driver = User.objects.create_user(username='driver@example.com', password='secret')
+        DeliveryPartnerProfile.objects.create(user=self.driver, is_approved=True)
+        self.client.force_authenticate(self.driver)
+
+    def add_shipments(self, count, status='assigned'):
+        for i in range(count):
+            order = Order.objects.create(school=self.school, customer_name=f'Parent {i}', status='completed')
+            Shipment.objects.create(order=order, delivery_partner=self.driver, status=status)
+
+    def fetch(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('delivery-shipments'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_order_summary_is_embedded_without_extra_queries(self):
+        self.add_shipments(1)
+        response, small = self.fetch()
+        summary = response.data['results'][0]['order_summary']
+        self.assertEqual(summary['school_name'], 'Greenwood High')
+        self.assertEqual(summary['school_address'], '1 Main Rd')
+        self.add_shipments(10)
+        _, large = self.fetch()
+        self.assertEqual(small, large)
+
+    def test_status_filter(self):
+        self.add_shipments(2, status='assigned')
+        self.add_shipments(3, status='in_transit')
+        response, _ = self.fetch(status='picked_up,in_transit')
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        session = self.client.session
+        session['cart_seen'] = True
+        session.save()
+
+    def test_catalog_browsing_does_not_write_sessions(self):
+        self.client.get(reverse('schools-list'))
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                self.client.get(reverse('schools-list'))
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+
+    def test_stale_session_expiry_is_refreshed(self):
+        store = SessionStore(self.client.session.session_key)
+        store[REFRESHED_AT_KEY] = 0
+        super(SessionStore, store).save()
+        before = Session.objects.get(session_key=store.session_key).expire_date
+        Session.objects.filter(session_key=store.session_key).update(expire_date=before - timedelta(days=3))
+
+        self.client.get(reverse('schools-list'))
+        refreshed = SessionStore(store.session_key).load()
+        self.assertGreater(refreshed[REFRESHED_AT_KEY], 0)
+        self.assertGreater(Session.objects.get(session_key=store.session_key).expire_date, before - timedelta(days=3))
+
+
+class LazyCartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(school=school, garment_type='blazer', price=Decimal('45.00'))
+
+    def test_viewing_cart_persists_nothing(self):
+        response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['total'], 0)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_first_add_materializes_cart(self):
+        response = self.client.post(reverse('add-to-cart'), {'product': self.product.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_purge_empty_carts(self):
+        stale = timezone.now() - timedelta(days=2)
+        empty = Cart.objects.create(session_key='empty')
+        full = Cart.objects.create(session_key='full')
+        CartItem.objects.create(cart=full, product=self.product)
+        fresh = Cart.objects.create(session_key='fresh')
+        Cart.objects.filter(pk__in=[empty.pk, full.pk]).update(updated_at=stale)
+
+        call_command('purge_empty_carts', batch_size=1, pause=0, stdout=mock.Mock())
+
+        self.assertEqual(set(Cart.objects.values_list('session_key', flat=True)), {'full', 'fresh'})
+
+
+class AddToCartUpsertTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(school=school, garment_type='blazer', price=Decimal('45.00'))
+
+    def add(self, **data):
+        return self.client.post(reverse('add-to-cart'), dict(product=self.product.id, **data), format='json')
+
+    def test_repeat_add_increments_and_merges_measurements(self):
+        self.assertEqual(self.add(quantity=1, student_name='Sipho', waist=60).status_code, 201)
+        response = self.add(quantity=2, student_name='Sipho', hips=70)
+        self.assertEqual(response.status_code, 200)
+        item = CartItem.objects.get()
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(item.measurements, {'waist': 60.0, 'hips': 70.0})
+
+    def test_missing_student_name_counts_as_one_line(self):
+        self.add(quantity=1)
+        self.add(quantity=1, student_name='')
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_increment_is_a_single_update(self):
+        self.add(quantity=1, student_name='Sipho')
+        cart = Cart.objects.get()
+        with CaptureQueriesContext(connection) as queries:
+            CartItem.objects.add_or_increment(cart, self.product, quantity=1, student_name='Sipho', measurements={'neck': 30})
+        writes = [q['sql'] for q in queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+
+    def test_lost_insert_race_is_retried_as_an_increment(self):
+        self.add(quantity=1, student_name='Sipho')
+        cart = Cart.objects.get()
+        real_update = QuerySet.update
+        calls = []
+
+        def update(queryset, **kwargs):
+            # The first UPDATE misses, as if the other request had not committed its insert yet
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update):
+            item, created = CartItem.objects.add_or_increment(cart, self.product, quantity=2, student_name='Sipho')
+        self.assertFalse(created)
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_renaming_onto_an_existing_line_merges_them(self):
+        self.add(quantity=1, student_name='Sipho', waist=60)
+        moved = self.add(quantity=2, student_name='Thandi', hips=70).data['id']
+        response = self.client.patch(
+            reverse('update-cart-item', kwargs={'pk': moved}), {'student_name': 'Sipho'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        item = CartItem.objects.get()
+        self.assertEqual(response.data['id'], item.id)
+        self.assertEqual((item.student_name, item.quantity), ('Sipho', 3))
+        self.assertEqual(item.measurements, {'waist': 60.0, 'hips': 70.0})
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    def test_parallel_adds_do_not_lose_increments(self):
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        product = Product.objects.create(school=school, garment_type='blazer', price=Decimal('45.00'))
+        cart = Cart.objects.create(session_key='parallel')
+
+        def add(_):
+            try:
+                CartItem.objects.add_or_increment(cart, product, quantity=1, student_name='Sipho')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(add, range(40)))
+
+        item = CartItem.objects.get()
+        self.assertEqual(item.quantity, 40)
+
+
+class BulkAddToCartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.products = [
+            Product.objects.create(school=school, garment_type=garment, price=Decimal('20.00'))
+            for garment in ('shirt_blouse', 'trousers_pants', 'blazer', 'accessory')
+        ]
+
+    def bulk_add(self, items):
+        return self.client.post(reverse('bulk-add-to-cart'), {'items': items}, format='json')
+
+    def uniform_set(self, student_name, **extra):
+        return [dict(product=product.id, student_name=student_name, **extra) for product in self.products]
+
+    def test_adds_a_set_for_each_student_and_returns_the_cart(self):
+        response = self.bulk_add(self.uniform_set('Sipho', waist=60) + self.uniform_set('Lerato'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 8)
+        self.assertEqual(response.data['total'], Decimal('160.00'))
+        self.assertEqual(CartItem.objects.filter(student_name='Sipho', measurements__waist=60.0).count(), 4)
+
+    def test_existing_and_repeated_lines_are_incremented(self):
+        self.client.post(reverse('add-to-cart'), {'product': self.products[0].id, 'student_name': 'Sipho'}, format='json')
+        response = self.bulk_add([
+            {'product': self.products[0].id, 'student_name': 'Sipho', 'quantity': 2, 'neck': 30},
+            {'product': self.products[1].id, 'student_name': 'Sipho'},
+            {'product': self.products[1].id, 'student_name': 'Sipho', 'quantity': 3},
+        ])
+        self.assertEqual(response.status_code, 201)
+        quantities = dict(CartItem.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.products[0].id: 3, self.products[1].id: 4})
+        self.assertEqual(CartItem.objects.get(product=self.products[0]).measurements, {'neck': 30.0})
+
+    def test_unknown_product_rejects_the_whole_batch(self):
+        response = self.bulk_add(self.uniform_set('Sipho') + [{'product': 9999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        self.bulk_add(self.uniform_set('Sipho'))
+        with CaptureQueriesContext(connection) as small:
+            self.bulk_add(self.uniform_set('Lerato') + self.uniform_set('Sipho'))
+        with CaptureQueriesContext(connection) as large:
+            self.bulk_add(self.uniform_set('Thabo') + self.uniform_set('Naledi') + self.uniform_set('Sipho') * 3)
+        self.assertEqual(len(small), len(large))
+
+    def test_lost_insert_race_is_retried_as_an_increment(self):
+        self.bulk_add([{'product': self.products[0].id, 'student_name': 'Sipho', 'waist': 60}])
+        real_values_list = QuerySet.values_list
+        calls = []
+
+        def values_list(queryset, *fields, **kwargs):
+            # The first lookup misses the line, as if the other request had not committed it yet
+            calls.append(fields)
+            return queryset.none() if len(calls) == 1 else real_values_list(queryset, *fields, **kwargs)
+
+        with mock.patch.object(QuerySet, 'values_list', values_list):
+            response = self.bulk_add([
+                {'product': self.products[0].id, 'student_name': 'Sipho', 'quantity': 2, 'neck': 30},
+                {'product': self.products[1].id, 'student_name': 'Sipho'},
+            ])
+        self.assertEqual(response.status_code, 201)
+        item = CartItem.objects.get(product=self.products[0])
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(item.measurements, {'waist': 60.0, 'neck': 30.0})
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+class OrderCodeTests(TestCase):
+    def test_codes_are_unique_across_allocators_and_carry_a_check_character(self):
+        allocators = [OrderCodeAllocator(key='test', block_size=50) for _ in range(3)]
+        codes = [allocators[i % 3].next_code() for i in range(3000)]
+        self.assertEqual(len(set(codes)), 3000)
+        self.assertTrue(all(is_valid_code(code) and len(code) == 8 for code in codes))
+        # 3000 codes from blocks of 50 is 60 reservations, however the allocators interleave
+        self.assertEqual(sum(allocator.sequence.reservations for allocator in allocators), 60)
+
+    def test_check_character_catches_a_single_typo(self):
+        code = encode(CodePermutation('test').scramble(12345))
+        for position in range(len(code)):
+            typo = code[:position] + ('1' if code[position] != '1' else '2') + code[position + 1:]
+            self.assertFalse(is_valid_code(typo))
+
+    def test_permutation_round_trips(self):
+        permutation = CodePermutation('test')
+        for number in (0, 1, 2, 10 ** 9, 32 ** 7 - 1):
+            self.assertEqual(permutation.unscramble(decode(encode(permutation.scramble(number)))), number)
+
+    def test_orders_get_a_code_and_secure_token(self):
+        order = Order.objects.create(customer_name='Thandi')
+        self.assertTrue(is_valid_code(order.order_code))
+        with CaptureQueriesContext(connection) as queries:
+            token = order.generate_confirmation_token()
+        self.assertFalse(any('"core_order" ' in query['sql'] for query in queries))
+        self.assertEqual(len(token), 64)
+        self.assertNotEqual(token, Order.objects.create(customer_name='Sipho').generate_confirmation_token())
+
+    def test_reused_block_is_discarded_after_a_collision(self):
+        allocator = OrderCodeAllocator(key='test', block_size=10)
+        taken = allocator.next_code()
+        Order.objects.create(order_code=taken)
+        allocator.discard_block()
+        # Replay the same block, as if its reservation had been rolled back
+        allocator.sequence.next_value, allocator.sequence.end = 0, 10
+        with mock.patch('core.codes.order_code_allocator', return_value=allocator):
+            order = Order.objects.create(customer_name='Thandi')
+        self.assertNotEqual(order.order_code, taken)
+
+    def test_codes_depend_on_the_key(self):
+        self.assertNotEqual(
+            [CodePermutation('one').scramble(n) for n in range(5)],
+            [CodePermutation('two').scramble(n) for n in range(5)],
+        )
+
+
+class ConfirmationTokenTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        tailor = User.objects.create_user(username='tailor@example.com', password='secret')
+        self.client.force_authenticate(tailor)
+        self.order = Order.objects.create(school=self.school, status='confirmed', tailor=tailor, deadline=timezone.now())
+        self.token = self.order.generate_confirmation_token()
+
+    def confirm(self, token):
+        return self.client.patch(reverse('tailor-confirm-order', kwargs={'confirmation_token': token}))
+
+    def test_only_the_digest_is_stored(self):
+        stored = OrderConfirmationToken.objects.get(order=self.order)
+        self.assertEqual(stored.digest, token_digest(self.token))
+        self.assertNotIn(self.token, stored.digest)
+
+    def test_token_resolves_in_one_query_and_is_used_up(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.confirm(self.token)
+        self.assertEqual(response.status_code, 200)
+        lookups = [q['sql'] for q in queries if 'core_orderconfirmationtoken' in q['sql'] and q['sql'].startswith('SELECT')]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"core_orderconfirmationtoken"."digest" =', lookups[0])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'in_production')
+        self.assertEqual(self.confirm(self.token).status_code, 404)
+
+    def test_concurrent_confirmation_loses_without_side_effects(self):
+        real_get_object = TailorOrderConfirmationView.get_object
+
+        def get_object(view):
+            # The other request confirms the order after this one has resolved the token
+            order = real_get_object(view)
+            Order.objects.filter(pk=order.pk).update(status='in_production')
+            return order
+
+        with mock.patch.object(TailorOrderConfirmationView, 'get_object', get_object):
+            response = self.confirm(self.token)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertTrue(OrderConfirmationToken.objects.filter(order=self.order).exists())
+
+    def test_expired_and_unknown_tokens_are_rejected(self):
+        OrderConfirmationToken.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.confirm(self.token).status_code, 404)
+        self.assertEqual(self.confirm('not-a-token').status_code, 404)
+
+    def test_reissuing_replaces_the_old_token(self):
+        new_token = self.order.generate_confirmation_token()
+        self.assertEqual(OrderConfirmationToken.objects.count(), 1)
+        self.assertEqual(self.confirm(self.token).status_code, 404)
+        self.assertEqual(self.confirm(new_token).status_code, 200)
+
+    def test_purge_deletes_only_expired_tokens(self):
+        other = Order.objects.create(school=self.school, status='confirmed')
+        other.generate_confirmation_token()
+        OrderConfirmationToken.objects.filter(order=other).update(expires_at=timezone.now() - timedelta(days=1))
+        call_command('purge_confirmation_tokens', batch_size=1, pause=0, stdout=StringIO())
+        self.assertEqual(list(OrderConfirmationToken.objects.values_list('order_id', flat=True)), [self.order.id])
+
+
+class ProductImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        cache.clear()
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(
+            school=self.school, garment_type='blazer', price=Decimal('45.00'), image=self.upload('blazer.jpg'),
+        )
+
+    def upload(self, name, size=(1200, 1600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (20, 60, 120)).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def products(self):
+        return self.client.get(reverse('school-products', kwargs={'school_id': self.school.id})).json()
+
+    def test_backfill_builds_resized_copies_and_srcset(self):
+        self.assertIsNone(self.products()[0]['srcset'])
+        call_command('build_image_derivatives', workers=1, stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertFalse(pending_products().exists())
+        widths = sorted({item['width'] for item in self.product.image_derivatives})
+        self.assertEqual(widths, [200, 400, 800])
+        self.assertEqual({item['format'] for item in self.product.image_derivatives}, {'webp', 'jpeg'})
+
+        # The catalog cache is invalidated, so the listing picks the derivatives up
+        srcset = self.products()[0]['srcset']
+        self.assertRegex(srcset['webp'], r'^http://testserver/media/products/derivatives/[0-9a-f]{16}-200w\.webp 200w, ')
+        self.assertIn('-800w.jpg 800w', srcset['jpeg'])
+
+    def test_small_images_are_never_upscaled(self):
+        self.product.image = self.upload('tie.jpg', size=(300, 300))
+        self.product.save()
+        call_command('build_image_derivatives', workers=1, stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(sorted({item['width'] for item in self.product.image_derivatives}), [200, 300])
+
+    def test_replaced_image_hides_stale_derivatives_until_rebuilt(self):
+        call_command('build_image_derivatives', workers=1, stdout=StringIO())
+        self.product.refresh_from_db()
+        self.product.image = self.upload('blazer-new.jpg')
+        self.product.save()
+        self.assertIsNone(self.products()[0]['srcset'])
+        self.assertTrue(pending_products().filter(pk=self.product.pk).exists())
+
+    def test_upload_schedules_a_background_build_after_commit(self):
+        with override_settings(PRODUCT_IMAGE_DERIVATIVES_ON_UPLOAD=True), \
+                mock.patch('core.signals.schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.image = self.upload('blazer-v2.jpg')
+                self.product.save()
+        schedule.assert_called_once_with(self.product.pk)
+
+
+class ChunkedImageUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.chunk_dir = os.path.join(media_root, 'chunks')
+        upload_settings = override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+        chunk_dir = mock.patch('core.uploads.CHUNKED_UPLOAD_DIR', self.chunk_dir)
+        chunk_dir.start()
+        self.addCleanup(chunk_dir.stop)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='secret', is_staff=True))
+        school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.product = Product.objects.create(school=school, garment_type='blazer', price=Decimal('45.00'))
+
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), (200, 30, 30)).save(buffer, 'PNG')
+        self.content = buffer.getvalue()
+
+    def start(self, sha256=None):
+        response = self.client.post(reverse('product-image-upload-create', kwargs={'pk': self.product.pk}), {
+            'filename': 'blazer.png',
+            'size': len(self.content),
+            'sha256': sha256 or hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return reverse('image-upload', kwargs={'pk': response.data['id']})
+
+    def send(self, url, offset, data):
+        return self.client.generic('PATCH', url, data, content_type='application/offset+octet-stream',
+                                   HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_are_assembled_and_attached(self):
+        url = self.start()
+        half = len(self.content) // 2
+        self.assertEqual(self.send(url, 0, self.content[:half]).data['offset'], half)
+        response = self.send(url, half, self.content[half:])
+        self.assertEqual(response.data['status'], 'complete')
+
+        self.product.refresh_from_db()
+        with self.product.image.open('rb') as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertEqual(os.listdir(self.chunk_dir), [])
+
+    def test_resume_after_a_dropped_chunk(self):
+        url = self.start()
+        self.send(url, 0, self.content[:100])
+        # The client lost track, it sends from the wrong place and is told where to resume
+        response = self.send(url, 0, self.content[:100])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 100)
+        self.assertEqual(self.client.get(url).data['offset'], 100)
+        self.assertEqual(self.send(url, 100, self.content[100:]).data['status'], 'complete')
+
+    def test_concurrent_chunks_at_one_offset_append_once(self):
+        url = self.start()
+        responses = []
+
+        def append(upload, stream, length):
+            # A second request with the same chunk arrives while this one is appending
+            responses.append(self.send(url, 0, self.content[:100]))
+            return append_chunk(upload, stream, length)
+
+        with mock.patch('core.productsviews.append_chunk', append):
+            self.assertEqual(self.send(url, 0, self.content[:100]).data['offset'], 100)
+        self.assertEqual(responses[0].status_code, 409)
+        self.assertEqual(os.path.getsize(os.path.join(self.chunk_dir, os.listdir(self.chunk_dir)[0])), 100)
+        self.assertEqual(self.send(url, 100, self.content[100:]).data['status'], 'complete')
+
+    def test_claim_of_a_dead_request_expires(self):
+        url = self.start()
+        ImageUpload.objects.update(status='receiving', updated_at=timezone.now())
+        self.assertEqual(self.send(url, 0, self.content).status_code, 409)
+        ImageUpload.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.send(url, 0, self.content).data['status'], 'complete')
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        url = self.start(sha256='0' * 64)
+        response = self.send(url, 0, self.content)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ImageUpload.objects.get().status, 'failed')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_oversized_chunks_and_non_images_are_rejected(self):
+        url = self.start()
+        with mock.patch('core.productsviews.CHUNKED_UPLOAD_MAX_CHUNK', 10):
+            self.assertEqual(self.send(url, 0, self.content).status_code, 413)
+        response = self.client.post(reverse('product-image-upload-create', kwargs={'pk': self.product.pk}), {
+            'filename': 'notes.pdf', 'size': 10, 'sha256': '0' * 64,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunks_are_streamed_not_buffered(self):
+        url = self.start()
+        with mock.patch('core.uploads.READ_SIZE', 256):
+            reads = []
+
+            def append(upload, stream, length):
+                read = stream.read
+                stream.read = lambda size=-1: reads.append(size) or read(size)
+                return append_chunk(upload, stream, length)
+
+            with mock.patch('core.productsviews.append_chunk', append):
+                self.send(url, 0, self.content)
+        self.assertTrue(reads and max(reads) <= 256)
+
+
+class AdminChangelistQueryTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username='root', email='root@example.com', password='secret')
+        self.client.force_login(self.admin_user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            i = self.rows = self.rows + 1
+            school = School.objects.create(name=f'School {i}', address='1 Main Rd', is_active=True)
+            product = Product.objects.create(school=school, garment_type='blazer', price=Decimal('45.00'))
+            tailor = User.objects.create(username=f'tailor{i}')
+            TailorProfile.objects.create(user=tailor, id_number=f'T{i}').schools.add(school)
+            driver = User.objects.create(username=f'driver{i}')
+            DeliveryPartnerProfile.objects.create(user=driver, id_number=f'D{i}')
+            cart = Cart.objects.create(session_key=f'session{i}', user=tailor)
+            CartItem.objects.create(cart=cart, product=product, student_name=f'Student {i}')
+            order = Order.objects.create(school=school, tailor=tailor, status='confirmed')
+            OrderLine.objects.create(order=order, product=product, quantity=1, price=Decimal('45.00'))
+            Shipment.objects.create(order=order, delivery_partner=driver)
+            Payment.objects.create(order=order, amount=Decimal('45.00'), transaction_id=f'PAY-{i}')
+            OutboundEmail.objects.create(subject=f'Mail {i}', body='Hello', recipients=['a@example.com'])
+            PaymentEvent.objects.create(event_id=f'WH-{i}', event_type='PAYMENT.SALE.COMPLETED', payload={})
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        models = [User, School, Product, Cart, CartItem, Order, OrderLine, TailorProfile,
+                  DeliveryPartnerProfile, Shipment, Payment, OutboundEmail, PaymentEvent]
+        self.add_rows(2)
+        small = {model: self.changelist_queries(model) for model in models}
+        self.add_rows(8)
+        for model in models:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.changelist_queries(model), small[model])
+
+    def test_profile_flags_come_from_the_changelist_query(self):
+        self.add_rows(3)
+        url = reverse('admin:auth_user_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'tailor3')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "core_tailorprofile"' in q['sql']
+                          and 'EXISTS' not in q['sql']])
+
+    def test_filtered_changelist_skips_the_full_table_count(self):
+        self.add_rows(2)
+        url = reverse('admin:core_order_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'status__exact': 'confirmed'})
+        counts = [q['sql'] for q in queries if 'COUNT(' in q['sql'] and 'core_order' in q['sql']]
+        self.assertEqual(len(counts), 1)
+
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        self.add_rows(1)
+        with mock.patch('core.admin.estimated_row_count', return_value=5000000):
+            response = self.client.get(reverse('admin:core_order_changelist'))
+        self.assertContains(response, '5000000')
+
+    def test_payment_events_are_append_only(self):
+        self.add_rows(1)
+        event = PaymentEvent.objects.get()
+        self.assertEqual(self.client.get(reverse('admin:core_paymentevent_add')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:core_paymentevent_delete', args=[event.pk])).status_code, 403)
+        response = self.client.get(reverse('admin:core_paymentevent_change', args=[event.pk]))
+        self.assertNotIn('payload', response.context['adminform'].form.fields)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='secret', is_staff=True))
+        self.school = School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+        self.blazer = Product.objects.create(school=self.school, garment_type='blazer', price=Decimal('45.00'))
+        self.shirt = Product.objects.create(school=self.school, garment_type='shirt_blouse', price=Decimal('10.00'))
+
+    def paid_order(self, blazers=2, shirts=1, status='confirmed'):
+        order = Order.objects.create(school=self.school)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=product, quantity=quantity, price=product.price)
+            for product, quantity in ((self.blazer, blazers), (self.shirt, shirts)) if quantity
+        ])
+        order.status = status
+        order.save()
+        return order
+
+    def rollups(self):
+        return {
+            (row.garment_type, row.status): (row.orders, row.units, row.revenue)
+            for row in SalesRollup.objects.filter(orders__gt=0)
+        }
+
+    def test_status_changes_move_sales_between_buckets(self):
+        order = self.paid_order()
+        self.assertEqual(self.rollups(), {
+            ('blazer', 'confirmed'): (1, 2, Decimal('90.00')),
+            ('shirt_blouse', 'confirmed'): (1, 1, Decimal('10.00')),
+            ('', 'confirmed'): (1, 3, Decimal('100.00')),
+        })
+        order.status = 'in_production'
+        order.save()
+        self.assertEqual(set(self.rollups()), {('blazer', 'in_production'), ('shirt_blouse', 'in_production'), ('', 'in_production')})
+        order.delete()
+        self.assertEqual(self.rollups(), {})
+
+    def test_pending_orders_are_not_counted(self):
+        self.paid_order(status='pending')
+        self.assertFalse(SalesRollup.objects.exists())
+
+    def test_abandoned_checkouts_are_not_counted(self):
+        abandoned = self.paid_order(status='pending')
+        abandoned.status = 'cancelled'
+        abandoned.save()
+        self.assertFalse(SalesRollup.objects.exists())
+
+        refunded = self.paid_order()
+        Payment.objects.create(order=refunded, amount=Decimal('100.00'), status='completed', transaction_id='PAY-1')
+        refunded.status = 'cancelled'
+        refunded.save()
+        self.assertEqual(set(self.rollups()), {('blazer', 'cancelled'), ('shirt_blouse', 'cancelled'), ('', 'cancelled')})
+
+        incremental = self.rollups()
+        SalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', days_per_chunk=1, pause=0, stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_order_created_paid_is_counted(self):
+        other = self.paid_order()
+        before = self.rollups()
+        # e.g. entered in the admin or imported, never pending
+        order = Order.objects.create(school=self.school, status='confirmed')
+        OrderLine.objects.create(order=order, product=self.blazer, quantity=1, price=self.blazer.price)
+        self.assertEqual(self.rollups()[('', 'confirmed')], (2, 4, Decimal('145.00')))
+
+        order.status = 'in_production'
+        order.save()
+        # Moving it on leaves the other order's sales where they were
+        self.assertEqual({key: value for key, value in self.rollups().items() if key[1] == 'confirmed'}, before)
+        self.assertEqual(self.rollups()[('blazer', 'in_production')], (1, 1, Decimal('45.00')))
+        other.delete()
+        order.delete()
+        self.assertEqual(self.rollups(), {})
+        self.assertFalse(SalesRollup.objects.filter(Q(orders__lt=0) | Q(units__lt=0) | Q(revenue__lt=0)).exists())
+
+    def test_line_changes_after_payment_are_rolled_up(self):
+        order = self.paid_order()
+        line = order.lines.get(product=self.blazer)
+        line.quantity = 5
+        line.save()
+        OrderLine.objects.create(order=order, product=self.shirt, quantity=2, price=Decimal('12.00'))
+        order.lines.get(product=self.shirt, quantity=1).delete()
+        self.assertEqual(self.rollups(), {
+            ('blazer', 'confirmed'): (1, 5, Decimal('225.00')),
+            ('shirt_blouse', 'confirmed'): (1, 2, Decimal('24.00')),
+            ('', 'confirmed'): (1, 7, Decimal('249.00')),
+        })
+
+        # A line moved to a pending order leaves the paid one's sales
+        pending = self.paid_order(blazers=0, shirts=0, status='pending')
+        line.order = pending
+        line.save()
+        self.assertNotIn(('blazer', 'confirmed'), self.rollups())
+
+        incremental = self.rollups()
+        SalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', days_per_chunk=1, pause=0, stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        for i in range(5):
+            order = self.paid_order(blazers=i + 1)
+            if i % 2:
+                order.status = 'delivered'
+                order.save()
+        incremental = self.rollups()
+        SalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', days_per_chunk=1, pause=0, stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def report(self, **params):
+        return self.client.get(reverse('sales-report'), params)
+
+    def test_report_by_garment_and_totals(self):
+        self.paid_order()
+        self.paid_order(blazers=1, shirts=0)
+        response = self.report(school=self.school.id, group_by='garment_type')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {'orders': 2, 'units': 4, 'revenue': Decimal('145.00')})
+        self.assertEqual(
+            [(row['garment_type'], row['orders'], row['units']) for row in response.data['rows']],
+            [('blazer', 2, 3), ('shirt_blouse', 1, 1)],
+        )
+
+    def test_report_queries_do_not_grow_with_orders(self):
+        self.paid_order()
+        with CaptureQueriesContext(connection) as small:
+            self.report(group_by='day,school,status')
+        for _ in range(10):
+            self.paid_order()
+        with CaptureQueriesContext(connection) as large:
+            response = self.report(group_by='day,school,status')
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(any('core_orderline' in query['sql'] for query in large.captured_queries))
+        self.assertEqual(response.data['rows'][0]['school_name'], 'Greenwood High')
+
+    def test_report_is_admin_only_and_validates_grouping(self):
+        self.assertEqual(self.report(group_by='colour').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(username='parent', password='secret'))
+        self.assertEqual(self.report().status_code, 403)
+
+
+@override_settings(METRICS_ENABLED=True, PAYMENT_GATEWAY='core.paymentgateway.FakeGateway')
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset_metrics()
+        self.addCleanup(metrics.reset_metrics)
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        School.objects.create(name='Greenwood High', address='1 Main Rd', is_active=True)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_latency_and_queries_per_endpoint(self):
+        cache.clear()
+        self.client.get(reverse('schools-list'))
+        text = self.scrape()
+        self.assertIn('http_requests_total{endpoint="schools-list",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="schools-list",method="GET"} 1', text)
+        # An uncached school list is a single SELECT
+        self.assertIn('http_request_db_queries_sum{endpoint="schools-list"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="schools-list",method="GET",le="+Inf"} 1', text)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_authenticate(User.objects.create_user(username='parent', password='secret'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_external_calls_are_timed(self):
+        from .paymentgateway import get_gateway
+        get_gateway().create_payment({'intent': 'sale'})
+        queue_mail('Hello', 'Body', 'shop@example.com', ['parent@example.com'])
+        deliver_batch()
+        text = self.scrape()
+        self.assertIn('external_call_duration_seconds_count{service="paypal",operation="create_payment"} 1', text)
+        self.assertIn('external_call_duration_seconds_count{service="smtp",operation="send"} 1', text)
+
+    def test_disabled_metrics_record_nothing(self):
+        with override_settings(METRICS_ENABLED=False):
+            client = APIClient()
+            client.get(reverse('schools-list'))
+            with metrics.external_call('paypal', 'find_payment'):
+                pass
+        self.assertEqual(metrics.REQUESTS.values, {})
+        self.assertEqual(metrics.EXTERNAL_LATENCY.values, {})
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(('a"b',), value)
+        lines = list(histogram.render())
+        self.assertIn('test_seconds_bucket{endpoint="a\\"b",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{endpoint="a\\"b",le="1.0"} 3', lines)
+        self.assertIn('test_seconds_bucket{endpoint="a\\"b",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{endpoint="a\\"b"} 4', lines)
+
+    def test_render_works_on_a_snapshot(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', ('endpoint',), buckets=(0.1, 1.0))
+        histogram.observe(('a',), 0.05)
+        rendered = histogram.render()
+        first = next(rendered)
+        # Observations made while the page is being written land in the next scrape
+        for endpoint in 'abcdefgh':
+            histogram.observe((endpoint,), 0.05)
+        lines = [first, *rendered]
+        self.assertIn('test_seconds_count{endpoint="a"} 1', lines)
+        self.assertFalse([line for line in lines if 'endpoint="b"' in line])
+
+
+class SeedScaleTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_scale', schools=4, tailors=3, orders=60, carts=12, end_date='2024-06-30',
+                     seed=7, stdout=StringIO(), **options)
+
+    def fingerprint(self):
+        return list(
+            Order.objects.order_by('id').values_list('school__name', 'status', 'total_amount', 'customer_name', 'created_at')
+        )
+
+    def test_seeds_consistent_related_rows(self):
+        self.seed(chunk_size=7, batch_size=5)
+        self.assertEqual(School.objects.count(), 4)
+        self.assertEqual(Product.objects.count(), 4 * len(Product.GARMENT_TYPES))
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertEqual(Cart.objects.count(), 12)
+        self.assertTrue(CartItem.objects.exclude(measurements=None).exists())
+        self.assertFalse(OrderLine.objects.exclude(product__school=F('order__school')).exists())
+        self.assertFalse(Order.objects.exclude(status='pending').filter(tailor=None).exists())
+        self.assertTrue(all(is_valid_code(code) for code in Order.objects.values_list('order_code', flat=True)))
+        self.assertTrue(SalesRollup.objects.exists())
+        # Live inserts carry on after the seeded keys
+        self.assertEqual(School.objects.create(name='New', address='x').pk, School.objects.aggregate(m=Max('pk'))['m'])
+
+    def test_output_does_not_depend_on_chunking(self):
+        self.seed(chunk_size=7)
+        first = self.fingerprint()
+        for model in (Cart, Order, TailorProfile, Product, School):
+            model.objects.all().delete()
+        self.seed(chunk_size=100)
+        self.assertEqual(self.fingerprint(), first)
+
+
+# Most queries a request to each endpoint of core/urls.py may run, whatever the size of the shop
+QUERY_BUDGETS = {
+    'auth-register': 2,
+    'auth-profile': 0,
+    'tailor-register': 11,
+    'delivery-register': 7,
+    'verify-email': 3,
+    'resend-verification': 4,
+    'schools-list': 1,
+    'school-detail': 1,
+    'school-products': 1,
+    'guest-checkout': 14,
+    'order-lookup': 2,
+    'tailor-confirm-order': 14,
+    'payment-initiate': 2,
+    'payment-execute': 5,
+    'payment-status': 2,
+    'payment-webhook': 3,
+    'cart-detail': 2,
+    'add-to-cart': 7,
+    'bulk-add-to-cart': 10,
+    'update-cart-item': 7,
+    'remove-from-cart': 3,
+    'tailor-orders': 3,
+    'tailor-order-update': 5,
+    'delivery-shipments': 2,
+    'delivery-shipment-update': 4,
+    'product-create': 2,
+    'product-management': 4,
+    'product-image-upload-create': 2,
+    'image-upload': 1,
+    'school-management': 2,
+    'user-list': 1,
+    'sales-report': 2,
+    'metrics': 0,
+    'tailor-approval': 4,
+    'delivery-approval': 3,
+}
+
+
+def format_queries(queries):
+    return '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(queries, 1))
+
+
+@override_settings(
+    PAYMENT_GATEWAY='core.paymentgateway.FakeGateway',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class QueryBudgetTests(TestCase):
+    """
+    Requests every endpoint against a small and a large shop. The query count
+    must not grow with the shop and must stay within the endpoint's budget.
+    """
+    SIZES = (1, 5)
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in urls.urlpatterns}, set(QUERY_BUDGETS))
+
+    def test_query_count_is_constant_and_within_budget(self):
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                small, large = (self.measure(name, size) for size in self.SIZES)
+                self.assertEqual(
+                    len(small), len(large),
+                    f'{name} ran {len(small)} queries for a shop of size {self.SIZES[0]} and {len(large)} for '
+                    f'size {self.SIZES[1]}\n--- size {self.SIZES[0]}\n{format_queries(small)}\n'
+                    f'--- size {self.SIZES[1]}\n{format_queries(large)}'
+                )
+                self.assertLessEqual(
+                    len(large), budget,
+                    f'{name} ran {len(large)} queries, its budget is {budget}\n{format_queries(large)}'
+                )
+
+    def measure(self, name, size):
+        """Build a shop of the given size, request the endpoint once and return the SQL it ran"""
+        with transaction.atomic():
+            cache.clear()
+            # Every run starts on a fresh block, so code reservations do not depend on earlier runs
+            order_code_allocator().discard_block()
+            self.shop = self.build_shop(size)
+            send = getattr(self, 'request_' + name.replace('-', '_'))()
+            with CaptureQueriesContext(connection) as queries:
+                response = send()
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f'{name} answered {response.status_code}: {response.content[:500]}')
+        return queries.captured_queries
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def build_shop(self, size):
+        """
+        A shop where everything an endpoint can list grows with size: schools,
+        products per school, users, orders and their lines, shipments, rollups
+        and the lines of a cart.
+        """
+        schools = School.objects.bulk_create([
+            # Tailors have to pick at least three schools when registering
+            School(name=f'School {i}', address=f'{i} Main Rd', is_active=True) for i in range(size + 2)
+        ])
+        products = Product.objects.bulk_create([
+            Product(school=school, garment_type=garment_type, price=Decimal('20.00'))
+            for school in schools
+            for garment_type, _ in Product.GARMENT_TYPES[:size]
+        ])
+        User.objects.bulk_create([User(username=f'parent-{i}', email=f'parent{i}@example.com') for i in range(size)])
+
+        tailor = User.objects.create_user(username='tailor', password='secret', email='tailor@example.com')
+        TailorProfile.objects.create(user=tailor, is_approved=True, is_email_verified=True).schools.set(schools)
+        courier = User.objects.create_user(username='courier', password='secret', email='courier@example.com')
+        DeliveryPartnerProfile.objects.create(user=courier, is_approved=True, is_email_verified=True)
+        pending_tailor = TailorProfile.objects.create(
+            user=User.objects.create_user(username='new-tailor', password='secret', email='new-tailor@example.com'),
+            email_verification_code='123456',
+        )
+        pending_tailor.schools.set(schools)
+        pending_courier = DeliveryPartnerProfile.objects.create(
+            user=User.objects.create_user(username='new-courier', password='secret', email='new-courier@example.com'),
+            email_verification_code='123456',
+        )
+        admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+
+        school_products = [product for product in products if product.school_id == schools[0].id]
+        orders, payments = [], []
+        for i in range(size):
+            order = Order.objects.create(school=schools[0], customer_name='Thandi', customer_email='thandi@example.com',
+                                         tailor=tailor, deadline=timezone.now() + timedelta(days=7))
+            lines = OrderLine.objects.bulk_create([
+                OrderLine(order=order, product=product, quantity=2, price=product.price, student_name=f'Student {j}')
+                for j, product in enumerate(school_products)
+            ])
+            order.total_amount = sum(line.price * line.quantity for line in lines)
+            order.status = 'confirmed'
+            order.save()
+            Shipment.objects.create(order=order, delivery_partner=courier, status='assigned')
+            payment = get_gateway().create_payment({'intent': 'sale'})
+            payments.append(Payment.objects.create(order=order, amount=order.total_amount, method='paypal',
+                                                   status='pending', transaction_id=payment['id']))
+            orders.append(order)
+
+        shopper = self.client_for()
+        shopper.post(reverse('bulk-add-to-cart'), {'items': [
+            {'product': product.id, 'student_name': 'Sipho', 'neck': 30} for product in school_products
+        ]}, format='json')
+
+        return {
+            'size': size, 'schools': schools, 'products': school_products, 'orders': orders, 'payments': payments,
+            'tailor': tailor, 'courier': courier, 'admin': admin, 'shopper': shopper,
+            'pending_tailor': pending_tailor, 'pending_courier': pending_courier,
+            'cart_item': CartItem.objects.first(),
+            'token': orders[0].generate_confirmation_token(),
+            'upload': ImageUpload.objects.create(product=products[0], filename='blazer.png', size=100,
+                                                 sha256='0' * 64, created_by=admin),
+        }
+
+    def registration(self, name):
+        return {'email': f'{name}@example.com', 'first_name': 'Lerato', 'last_name': 'Nkosi', 'password': 'secret-pass',
+                'id_number': f'ID-{name}'}
+
+    # One request per URL name, each given the shop built for it
+
+    def request_auth_register(self):
+        return lambda: self.client_for().post(reverse('auth-register'), {
+            'username': 'signup', 'email': 'signup@example.com', 'password': 'secret-pass',
+        }, format='json')
+
+    def request_auth_profile(self):
+        return lambda: self.client_for(self.shop['tailor']).get(reverse('auth-profile'))
+
+    def request_tailor_register(self):
+        data = dict(self.registration('signup-tailor'), schools=[school.id for school in self.shop['schools']])
+        return lambda: self.client_for().post(reverse('tailor-register'), data, format='json')
+
+    def request_delivery_register(self):
+        return lambda: self.client_for().post(reverse('delivery-register'), self.registration('signup-courier'), format='json')
+
+    def request_verify_email(self):
+        return lambda: self.client_for().patch(reverse('verify-email'), {
+            'email': 'new-tailor@example.com', 'verification_code': '123456', 'user_type': 'tailor',
+        }, format='json')
+
+    def request_resend_verification(self):
+        return lambda: self.client_for().post(reverse('resend-verification'), {
+            'email': 'new-courier@example.com', 'user_type': 'delivery',
+        }, format='json')
+
+    def request_schools_list(self):
+        return lambda: self.client_for().get(reverse('schools-list'))
+
+    def request_school_detail(self):
+        return lambda: self.client_for().get(reverse('school-detail', kwargs={'pk': self.shop['schools'][0].id}))
+
+    def request_school_products(self):
+        return lambda: self.client_for().get(reverse('school-products', kwargs={'school_id': self.shop['schools'][0].id}))
+
+    def request_guest_checkout(self):
+        return lambda: self.shop['shopper'].post(reverse('guest-checkout'), {
+            'customer_name': 'Thandi', 'customer_email': 'thandi@example.com', 'school': self.shop['schools'][0].id,
+        }, format='json')
+
+    def request_order_lookup(self):
+        return lambda: self.client_for().get(reverse('order-lookup', kwargs={'order_code': self.shop['orders'][0].order_code}))
+
+    def request_tailor_confirm_order(self):
+        url = reverse('tailor-confirm-order', kwargs={'confirmation_token': self.shop['token']})
+        return lambda: self.client_for(self.shop['tailor']).patch(url, {}, format='json')
+
+    def request_payment_initiate(self):
+        order = self.shop['orders'][0]
+        # An order gets a single payment, as if the first attempt had been abandoned
+        Payment.objects.filter(order=order).delete()
+        return lambda: self.client_for(self.shop['admin']).post(reverse('payment-initiate'), {
+            'order_id': order.id, 'order_code': order.order_code,
+        }, format='json')
+
+    def request_payment_execute(self):
+        return lambda: self.client_for(self.shop['admin']).post(reverse('payment-execute'), {
+            'paymentID': self.shop['payments'][0].transaction_id, 'payerID': 'PAYER',
+        }, format='json')
+
+    def request_payment_status(self):
+        return lambda: self.client_for().get(reverse('payment-status'), {'payment_id': self.shop['payments'][0].transaction_id})
+
+    def request_payment_webhook(self):
+        return lambda: self.client_for().post(reverse('payment-webhook'), {
+            'id': 'WH-1', 'event_type': 'PAYMENT.SALE.COMPLETED', 'create_time': '2025-09-01T10:00:00Z',
+            'resource': {'id': 'SALE-1', 'parent_payment': self.shop['payments'][0].transaction_id},
+        }, format='json', HTTP_PAYPAL_TRANSMISSION_ID='t-1')
+
+    def request_cart_detail(self):
+        return lambda: self.shop['shopper'].get(reverse('cart-detail'))
+
+    def request_add_to_cart(self):
+        return lambda: self.shop['shopper'].post(reverse('add-to-cart'), {
+            'product': self.shop['products'][0].id, 'student_name': 'Sipho', 'neck': 31,
+        }, format='json')
+
+    def request_bulk_add_to_cart(self):
+        return lambda: self.shop['shopper'].post(reverse('bulk-add-to-cart'), {'items': [
+            {'product': product.id, 'student_name': 'Lerato'} for product in self.shop['products']
+        ]}, format='json')
+
+    def request_update_cart_item(self):
+        url = reverse('update-cart-item', kwargs={'pk': self.shop['cart_item'].pk})
+        return lambda: self.shop['shopper'].patch(url, {'quantity': 3}, format='json')
+
+    def request_remove_from_cart(self):
+        return lambda: self.shop['shopper'].delete(reverse('remove-from-cart', kwargs={'pk': self.shop['cart_item'].pk}))
+
+    def request_tailor_orders(self):
+        return lambda: self.client_for(self.shop['tailor']).get(reverse('tailor-orders'))
+
+    def request_tailor_order_update(self):
+        url = reverse('tailor-order-update', kwargs={'id': self.shop['orders'][0].id})
+        return lambda: self.client_for(self.shop['tailor']).patch(url, {'customer_phone': '0821234567'}, format='json')
+
+    def request_delivery_shipments(self):
+        return lambda: self.client_for(self.shop['courier']).get(reverse('delivery-shipments'))
+
+    def request_delivery_shipment_update(self):
+        url = reverse('delivery-shipment-update', kwargs={'id': self.shop['orders'][0].shipment.id})
+        return lambda: self.client_for(self.shop['courier']).patch(url, {'status': 'picked_up'}, format='json')
+
+    def request_product_create(self):
+        return lambda: self.client_for(self.shop['admin']).post(reverse('product-create'), {
+            'school': self.shop['schools'][0].id, 'garment_type': 'accessory', 'price': '12.50',
+        }, format='json')
+
+    def request_product_management(self):
+        url = reverse('product-management', kwargs={'pk': self.shop['products'][0].id})
+        return lambda: self.client_for(self.shop['admin']).patch(url, {'price': '25.00'}, format='json')
+
+    def request_product_image_upload_create(self):
+        url = reverse('product-image-upload-create', kwargs={'pk': self.shop['products'][0].id})
+        return lambda: self.client_for(self.shop['admin']).post(url, {
+            'filename': 'blazer.png', 'size': 100, 'sha256': '0' * 64,
+        }, format='json')
+
+    def request_image_upload(self):
+        return lambda: self.client_for(self.shop['admin']).get(reverse('image-upload', kwargs={'pk': self.shop['upload'].pk}))
+
+    def request_school_management(self):
+        url = reverse('school-management', kwargs={'pk': self.shop['schools'][0].id})
+        return lambda: self.client_for(self.shop['admin']).patch(url, {'town': 'Durban'}, format='json')
+
+    def request_user_list(self):
+        return lambda: self.client_for(self.shop['admin']).get(reverse('user-list'))
+
+    def request_sales_report(self):
+        return lambda: self.client_for(self.shop['admin']).get(reverse('sales-report'), {'group_by': 'school,garment_type'})
+
+    def request_metrics(self):
+        return lambda: self.client_for(self.shop['admin']).get(reverse('metrics'))
+
+    def request_tailor_approval(self):
+        url = reverse('tailor-approval', kwargs={'id': self.shop['pending_tailor'].id})
+        return lambda: self.client_for(self.shop['admin']).patch(url, {'is_approved': True}, format='json')
+
+    def request_delivery_approval(self):
+        url = reverse('delivery-approval', kwargs={'id': self.shop['pending_courier'].id})
+        return lambda: self.client_for(self.shop['admin']).patch(url, {'is_approved': True}, format='json')
+
+
+# A SCAN without USING INDEX reads every row of the table
+FULL_TABLE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)')
+
+
+@skipIf(connection.vendor != 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class HotQueryPlanTests(TestCase):
+    """The lookups behind the hot endpoints must reach every table through an index"""
+
+    def setUp(self):
+        self.tailor = TailorProfile.objects.create(user=User.objects.create_user(username='tailor', password='secret'))
+
+    def hot_queries(self):
+        return {
+            # PaymentExecuteView, PaymentStatusView
+            'payment by transaction id': Payment.objects.select_related('order').filter(transaction_id='PAYID-1'),
+            # CartView, AddToCartView, GuestCheckoutView
+            'cart by session': Cart.objects.filter(session_key='abc'),
+            'cart with items by session': Cart.objects.for_display().filter(session_key='abc'),
+            # TailorOrderConfirmationView
+            'confirmation token': OrderConfirmationToken.objects.resolve('token').select_related('order__school'),
+            # OrderLookupView
+            'order by code': Order.objects.filter(order_code='4KQ7ZP2M'),
+            # Order admin status filter
+            'orders by status': Order.objects.filter(status='confirmed').order_by('-pk'),
+            # VerifyEmailView, ResendVerificationView and the registration views
+            'user by email': User.objects.filter(email='tailor@example.com'),
+            'tailor feed': Order.objects.filter(
+                school__in=self.tailor.schools.all(), status__in=['confirmed', 'in_production'],
+            ).order_by('-created_at', '-id'),
+            'shipment feed': Shipment.objects.filter(
+                delivery_partner=self.tailor.user, status__in=['assigned', 'picked_up'],
+            ).order_by('-created_at', '-id'),
+            'due mail': OutboundEmail.objects.filter(status__in=['pending', 'sending'], next_attempt_at__lte=timezone.now()),
+            'pending payment events': PaymentEvent.objects.filter(
+                status='pending', next_attempt_at__lte=timezone.now(),
+            ).order_by('event_created_at'),
+        }
+
+    def test_hot_queries_do_not_scan_whole_tables(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                scanned = [match.group(1) for match in FULL_TABLE_SCAN.finditer(plan)]
+                self.assertFalse(scanned, f'{name} scans {", ".join(scanned)}\n{queryset.query}\n{plan}')
@@ -0,0 +1,106 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from .models import ImageUpload
+
+CHUNKED_UPLOAD_DIR = getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'upload_chunks'))
+CHUNKED_UPLOAD_MAX_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+CHUNKED_UPLOAD_MAX_CHUNK = getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK', 8 * 1024 * 1024)
+# Seconds a request may hold an upload while it receives a chunk
+CHUNKED_UPLOAD_CLAIM_TIMEOUT = getattr(settings, 'CHUNKED_UPLOAD_CLAIM_TIMEOUT', 15 * 60)
+
+# Bytes read from the socket or the disk at a time, the most a request ever holds
+READ_SIZE = 64 * 1024
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+class UploadError(Exception):
+    """Raised when a chunk or a finished upload is rejected"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def partial_path(upload):
+    return os.path.join(CHUNKED_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def claim_chunk(upload, offset):
+    """
+    Claim the upload for the chunk starting at `offset`, returns False if it is taken.
+
+    A conditional UPDATE, so of two requests sending the same chunk only one
+    gets to append it, on every database. The claim is a lease: one left by a
+    request that died is given up after CHUNKED_UPLOAD_CLAIM_TIMEOUT.
+    """
+    now = timezone.now()
+    claimable = Q(status='uploading') | Q(status='receiving', updated_at__lt=now - timedelta(seconds=CHUNKED_UPLOAD_CLAIM_TIMEOUT))
+    return bool(
+        ImageUpload.objects.filter(claimable, pk=upload.pk, offset=offset).update(status='receiving', updated_at=now)
+    )
+
+
+def append_chunk(upload, stream, length):
+    """
+    Stream `length` bytes from `stream` onto the end of the partial file.
+
+    The caller must hold the claim from claim_chunk. Returns the new offset; a
+    connection that drops midway leaves the bytes read so far on disk but
+    only a fully received chunk moves the offset forward.
+    """
+    os.makedirs(CHUNKED_UPLOAD_DIR, exist_ok=True)
+    path = partial_path(upload)
+    with open(path, 'ab') as partial:
+        # Drop whatever an interrupted earlier chunk left past the offset
+        partial.truncate(upload.offset)
+        remaining = length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                raise UploadError('Chunk ended before Content-Length bytes were received.')
+            partial.write(data)
+            remaining -= len(data)
+    return upload.offset + length
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finish_upload(upload):
+    """Verify a fully received upload and attach it to its product as the new image"""
+    path = partial_path(upload)
+    try:
+        if file_sha256(path) != upload.sha256.lower():
+            raise UploadError('Checksum mismatch, the upload has to be restarted.', 422)
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:
+            raise UploadError('The uploaded file is not a valid image.', 422)
+
+        with open(path, 'rb') as f:
+            # Storage copies the file across in chunks, it is never read whole
+            upload.product.image.save(os.path.basename(upload.filename), File(f), save=True)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def discard_upload(upload):
+    path = partial_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import userviews, tailorviews, deliveryviews, paymentviews, orderviews, schoolsviews, productsviews, cartviews
+from . import userviews, tailorviews, deliveryviews, paymentviews, orderviews, schoolsviews, productsviews, cartviews, reportviews
 
 urlpatterns = [
     # Authentication
@@ -27,6 +27,7 @@ urlpatterns = [
     # Cart endpoints
     path('cart/', cartviews.CartView.as_view(), name='cart-detail'),
     path('cart/add/', cartviews.AddToCartView.as_view(), name='add-to-cart'),
+    path('cart/add/bulk/', cartviews.BulkAddToCartView.as_view(), name='bulk-add-to-cart'),
     path('cart/update/<int:pk>/', cartviews.UpdateCartItemView.as_view(), name='update-cart-item'),
     path('cart/remove/<int:pk>/', cartviews.RemoveFromCartView.as_view(), name='remove-from-cart'),
     
@@ -41,8 +42,12 @@ urlpatterns = [
     # Super Admin endpoints
     path('admin/products/', productsviews.ProductCreateView.as_view(), name='product-create'),
     path('admin/products/<int:pk>/', productsviews.ProductManagementView.as_view(), name='product-management'),
+    path('admin/products/<int:pk>/image-uploads/', productsviews.ProductImageUploadCreateView.as_view(), name='product-image-upload-create'),
+    path('admin/image-uploads/<uuid:pk>/', productsviews.ImageUploadView.as_view(), name='image-upload'),
     path('admin/schools/<int:pk>/', schoolsviews.SchoolManagementView.as_view(), name='school-management'),
     path('admin/users/', userviews.UserListView.as_view(), name='user-list'),
+    path('admin/reports/sales/', reportviews.SalesReportView.as_view(), name='sales-report'),
+    path('admin/metrics/', reportviews.MetricsView.as_view(), name='metrics'),
     path('admin/tailors/<int:id>/approval/', userviews.TailorApprovalView.as_view(), name='tailor-approval'),
     path('admin/delivery-partners/<int:id>/approval/', userviews.DeliveryPartnerApprovalView.as_view(), name='delivery-approval'),
 ]
\ No newline at end of file
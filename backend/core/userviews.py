@@ -184,7 +184,7 @@ class ResendVerificationView(generics.CreateAPIView):
             verification_code = profile.generate_verification_code()
             
             # Send email with verification code
-            from django.core.mail import send_mail
+            from .mailqueue import queue_mail
             from django.conf import settings
             
             subject = f'New Verification Code for {profile_name} Account'
@@ -199,12 +199,11 @@ class ResendVerificationView(generics.CreateAPIView):
             The School Uniforms Team
             '''
             
-            send_mail(
+            queue_mail(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
+                [email]
             )
             
             return Response({
@@ -1,18 +1,21 @@
 // src/components/DeliveryDashboard.js
 import React, { useState, useEffect } from 'react';
-import { deliveryAPI } from '../services/api';
+import { deliveryAPI, nextCursor } from '../services/api';
 import './DeliveryDashboard.css';
 
 const DeliveryDashboard = () => {
   const [shipments, setShipments] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
 
   useEffect(() => {
     const fetchShipments = async () => {
       try {
         const data = await deliveryAPI.getShipments();
-        setShipments(data);
+        setShipments(data.results);
+        setCursor(nextCursor(data.next));
       } catch (error) {
         setError('Failed to load shipments');
         console.error('Error fetching shipments:', error);
@@ -24,12 +27,26 @@ const DeliveryDashboard = () => {
     fetchShipments();
   }, []);
 
+  // The feed is cursor-paginated, 25 at a time; append the next page on request
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await deliveryAPI.getShipments({ cursor });
+      setShipments(previous => [...previous, ...data.results]);
+      setCursor(nextCursor(data.next));
+    } catch (error) {
+      console.error('Error loading more shipments:', error);
+      alert('Failed to load more shipments');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const updateShipmentStatus = async (shipmentId, newStatus) => {
     try {
-      await deliveryAPI.updateShipment(shipmentId, { status: newStatus });
-      // Refresh shipments list
-      const data = await deliveryAPI.getShipments();
-      setShipments(data);
+      const updated = await deliveryAPI.updateShipment(shipmentId, { status: newStatus });
+      // Update in place, refetching would drop every page after the first
+      setShipments(previous => previous.map(shipment => (shipment.id === shipmentId ? { ...shipment, ...updated } : shipment)));
     } catch (error) {
       console.error('Error updating shipment:', error);
       alert('Failed to update shipment status');
@@ -57,10 +74,10 @@ const DeliveryDashboard = () => {
               </div>
               
               <div className="shipment-details">
-                <p><strong>Order Code:</strong> {shipment.order.order_code}</p>
-                <p><strong>Customer:</strong> {shipment.order.customer_name}</p>
-                <p><strong>Delivery Address:</strong> {shipment.order.school.address}</p>
-                <p><strong>School:</strong> {shipment.order.school.name}</p>
+                <p><strong>Order Code:</strong> {shipment.order_summary?.order_code}</p>
+                <p><strong>Customer:</strong> {shipment.order_summary?.customer_name}</p>
+                <p><strong>Delivery Address:</strong> {shipment.order_summary?.school_address}</p>
+                <p><strong>School:</strong> {shipment.order_summary?.school_name}</p>
               </div>
               
               <div className="shipment-actions">
@@ -79,6 +96,14 @@ const DeliveryDashboard = () => {
           ))}
         </div>
       )}
+
+      {cursor && (
+        <div className="load-more">
+          <button onClick={loadMore} disabled={loadingMore} className="btn btn-secondary">
+            {loadingMore ? 'Loading...' : 'Load more shipments'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -13,11 +13,18 @@ const ImageHolder = ({ product }) => {
     <div style={styles.container}>
       <div style={styles.imageContainer}>
         {product.image ? (
-          <img 
-            src={product.image}
-            alt={product.name} 
-            style={styles.image} 
-          />
+          <picture style={styles.picture}>
+            {/* Resized copies once the backend has built them, the upload otherwise */}
+            {product.srcset && <source type="image/webp" srcSet={product.srcset.webp} sizes="200px" />}
+            <img 
+              src={product.image}
+              srcSet={product.srcset ? product.srcset.jpeg : undefined}
+              sizes="200px"
+              alt={product.name} 
+              style={styles.image} 
+              loading="lazy"
+            />
+          </picture>
         ) : (
           <div style={styles.placeholder}>
             <i className="fas fa-image" style={styles.placeholderIcon} />
@@ -57,6 +64,9 @@ const styles = {
     justifyContent: 'center',
     marginBottom: '15px'
   },
+  picture: {
+    display: 'contents'
+  },
   image: {
     maxWidth: '100%',
     maxHeight: '100%',
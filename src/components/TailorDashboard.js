@@ -1,18 +1,21 @@
 // src/components/TailorDashboard.js
 import React, { useState, useEffect } from 'react';
-import { tailorAPI } from '../services/api';
+import { tailorAPI, nextCursor } from '../services/api';
 import './TailorDashboard.css';
 
 const TailorDashboard = () => {
   const [orders, setOrders] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
 
   useEffect(() => {
     const fetchOrders = async () => {
       try {
         const data = await tailorAPI.getOrders();
-        setOrders(data);
+        setOrders(data.results);
+        setCursor(nextCursor(data.next));
       } catch (error) {
         setError('Failed to load orders');
         console.error('Error fetching orders:', error);
@@ -24,12 +27,26 @@ const TailorDashboard = () => {
     fetchOrders();
   }, []);
 
+  // The feed is cursor-paginated, 25 at a time; append the next page on request
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await tailorAPI.getOrders({ cursor });
+      setOrders(previous => [...previous, ...data.results]);
+      setCursor(nextCursor(data.next));
+    } catch (error) {
+      console.error('Error loading more orders:', error);
+      alert('Failed to load more orders');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const updateOrderStatus = async (orderId, newStatus) => {
     try {
-      await tailorAPI.updateOrder(orderId, { status: newStatus });
-      // Refresh orders list
-      const data = await tailorAPI.getOrders();
-      setOrders(data);
+      const updated = await tailorAPI.updateOrder(orderId, { status: newStatus });
+      // Update in place, refetching would drop every page after the first
+      setOrders(previous => previous.map(order => (order.id === orderId ? { ...order, ...updated } : order)));
     } catch (error) {
       console.error('Error updating order:', error);
       alert('Failed to update order status');
@@ -89,6 +106,14 @@ const TailorDashboard = () => {
           ))}
         </div>
       )}
+
+      {cursor && (
+        <div className="load-more">
+          <button onClick={loadMore} disabled={loadingMore} className="btn btn-secondary">
+            {loadingMore ? 'Loading...' : 'Load more orders'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
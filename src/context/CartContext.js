@@ -32,6 +32,18 @@ export const CartProvider = ({ children }) => {
     }
   };
 
+  const addManyToCart = async (items) => {
+    try {
+      // The bulk endpoint answers with the updated cart, no refetch needed
+      const data = await cartAPI.addItems(items);
+      setCart(data);
+      setCartCount(data.items.reduce((total, item) => total + item.quantity, 0));
+    } catch (error) {
+      console.error('Failed to add items to cart:', error);
+      throw error;
+    }
+  };
+
   const updateCartItem = async (itemId, quantity) => {
     try {
       await cartAPI.updateItem(itemId, quantity);
@@ -65,6 +77,7 @@ export const CartProvider = ({ children }) => {
     cart,
     cartCount,
     addToCart,
+    addManyToCart,
     updateCartItem,
     removeFromCart,
     clearCart,
@@ -128,6 +128,10 @@ export const cartAPI = {
     return api.post('/cart/add/', item).then(res => res.data);
   },
 
+  addItems: (items) => {
+    return api.post('/cart/add/bulk/', { items }).then(res => res.data);
+  },
+
   updateItem: (id, quantity) => {
     return api.patch(`/cart/update/${id}/`, { quantity }).then(res => res.data);
   },
@@ -175,9 +179,14 @@ export const paymentAPI = {
 };
 
 // Tailor API
+// Cursor of the page a paginated response's `next` link points to, or null on the last page
+export const nextCursor = (next) => (next ? new URL(next).searchParams.get('cursor') : null);
+
 export const tailorAPI = {
-  getOrders: () => {
-    return api.get('/tailor/orders/').then(res => res.data);
+  // Paginated: returns { next, previous, results }. Accepts status,
+  // deadline_before, deadline_after, page_size and cursor params.
+  getOrders: (params = {}) => {
+    return api.get('/tailor/orders/', { params }).then(res => res.data);
   },
 
   updateOrder: (id, data) => {
@@ -187,8 +196,10 @@ export const tailorAPI = {
 
 // Delivery API
 export const deliveryAPI = {
-  getShipments: () => {
-    return api.get('/delivery/shipments/').then(res => res.data);
+  // Paginated: returns { next, previous, results }. Accepts status,
+  // page_size and cursor params.
+  getShipments: (params = {}) => {
+    return api.get('/delivery/shipments/', { params }).then(res => res.data);
   },
 
   updateShipment: (id, data) => {